@@ -1,4 +1,5 @@
 import math
+import weakref
 from math import log, floor, ceil
 from Compiler.instructions import *
 from . import types
@@ -12,14 +13,25 @@ from . import instructions_base
 ##
 
 
+# basic block -> {(n, vector size, instruction type): register}
+_two_power_cache = weakref.WeakKeyDictionary()
+
 def two_power(n):
     if isinstance(n, int) and n < 31:
         return 2**n
     else:
+        # reuse within the same basic block, where the register is
+        # guaranteed to be set
+        cache = _two_power_cache.setdefault(program.Program.prog.curr_block, {})
+        key = n, instructions_base.get_global_vector_size(), \
+            instructions_base.get_global_instruction_type()
+        if key in cache:
+            return cache[key]
         max = types.cint(1) << 31
         res = 2**(n%31)
         for i in range(n // 31):
             res *= max
+        cache[key] = res
         return res
 
 def shift_two(n, pos):
@@ -1828,6 +1828,14 @@ class print_char4(base.IOInstruction):
     def __init__(self, val):
         super(print_char4, self).__init__(self.str_to_int(val))
 
+class print_chars(base.IOInstruction):
+    """ Output a string of any length.
+
+    :param: string (variable string)
+    """
+    code = base.opcodes['PRINTCHRS']
+    arg_format = ['varstr']
+
 class cond_print_str(base.IOInstruction):
     """ Conditionally output four bytes.
 
@@ -204,6 +204,7 @@ opcodes = dict(
     PRINTREGPLAINS = 0xEA,
     PRINTCHR = 0xB4,
     PRINTSTR = 0xB5,
+    PRINTCHRS = 0xEE,
     PUBINPUT = 0xB6,
     RAWOUTPUT = 0xB7,
     STARTPRIVATEOUTPUT = 0xB8,
@@ -939,11 +940,12 @@ class VarString(ArgFormat):
 
     @classmethod
     def encode(cls, arg):
-        return int_to_bytes(len(arg)) + list(bytearray(arg, 'ascii'))
+        arg = bytearray(arg, 'utf8')
+        return int_to_bytes(len(arg)) + list(arg)
 
     def __init__(self, f):
         length = IntArgFormat(f).i
-        self.str = str(f.read(length), 'ascii')
+        self.str = str(f.read(length), 'utf8')
 
     def __str__(self):
         return self.str
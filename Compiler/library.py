@@ -3,7 +3,7 @@ This module defines functions directly available in high-level programs,
 in particularly providing flow control and output.
 """
 
-from Compiler.types import cint,sint,cfix,sfix,sfloat,MPCThread,Array,MemValue,cgf2n,sgf2n,_number,_mem,_register,regint,Matrix,_types, cfloat, _single, localint, personal, copy_doc, _vec, SubMultiArray, _secret
+from Compiler.types import cint,sint,cfix,sfix,sfloat,MPCThread,Array,MemValue,cgf2n,sgf2n,_number,_mem,_register,regint,Matrix,_types, cfloat, _single, localint, personal, copy_doc, _vec, SubMultiArray, _secret, _vectorizable
 from Compiler.instructions import *
 from Compiler.util import tuplify,untuplify,is_zero
 from Compiler.allocator import RegintOptimizer, AllocPool
@@ -14,7 +14,7 @@ import random
 import collections
 import operator
 import copy
-from functools import reduce
+from functools import reduce, lru_cache
 
 def get_program():
     return instructions.program
@@ -25,8 +25,11 @@ def get_block():
 
 def vectorize(function):
     def vectorized_function(*args, **kwargs):
-        if len(args) > 0 and 'size' in dir(args[0]):
-            instructions_base.set_global_vector_size(args[0].size)
+        if not kwargs and not args:
+            return function()
+        size = getattr(args[0], 'size', None) if args else None
+        if size is not None:
+            instructions_base.set_global_vector_size(size)
             res = function(*args, **kwargs)
             instructions_base.reset_global_vector_size()
         elif 'size' in kwargs:
@@ -57,9 +60,38 @@ def set_instruction_type(function):
     return instruction_typed_function
 
 
+@lru_cache(maxsize=1024)
+def _utf8(s):
+    return bytes(s, 'utf8')
+
+@lru_cache(maxsize=1024)
+def _utf8_padded(s):
+    """ UTF-8 encoding padded with zeros to a multiple of four. """
+    res = _utf8(s)
+    return res + b'\0' * ((-len(res)) % 4)
+
 def _expand_to_print(val):
     return ('[' + ', '.join('%s' for i in range(len(val))) + ']',) + tuple(val)
 
+def _print_list(val, print_secrets):
+    print_str(*_expand_to_print(val), print_secrets=print_secrets)
+
+def _print_container(val, print_secrets):
+    val.output(print_secrets=print_secrets)
+
+# handlers for common public types in print_str by exact type,
+# other types go through the isinstance() checks
+_print_dispatch = {
+    cint: lambda val, print_secrets: val.print_reg_plain(),
+    regint: lambda val, print_secrets: val.print_reg_plain(),
+    cfix: lambda val, print_secrets: val.print_plain(),
+    cfloat: lambda val, print_secrets: val.print_float_plain(),
+    list: _print_list,
+    tuple: _print_list,
+    Array: _print_container,
+    Matrix: _print_container,
+}
+
 def print_str(s, *args, print_secrets=False):
     """ Print a string, with optional args for adding
     variables/registers with ``%s``.
@@ -71,15 +103,16 @@ def print_str(s, *args, print_secrets=False):
     """
     def print_plain_str(ss):
         """ Print a plain string (no custom formatting options) """
-        ss = bytearray(ss, 'utf8')
-        i = 1
-        while 4*i <= len(ss):
-            print_char4(ss[4*(i-1):4*i])
-            i += 1
-        i = 4*(i-1)
-        while i < len(ss):
-            print_char(ss[i])
-            i += 1
+        encoded = _utf8(ss)
+        if len(encoded) > 4:
+            # single instruction for the whole string
+            print_chars(ss)
+        elif len(encoded) == 4:
+            print_char4(encoded)
+        else:
+            # output individually to avoid printing padding
+            for c in encoded:
+                print_char(c)
 
     if len(args) != s.count('%s'):
         raise CompilerError('Incorrect number of arguments for string format:', s)
@@ -95,7 +128,10 @@ def print_str(s, *args, print_secrets=False):
                 val = args[i].read()
             else:
                 val = args[i]
-            if isinstance(val, Tape.Register):
+            handler = _print_dispatch.get(type(val))
+            if handler:
+                handler(val, print_secrets)
+            elif isinstance(val, Tape.Register):
                 from Compiler.GC.types import sbits
                 if val.is_clear:
                     val.print_reg_plain()
@@ -113,9 +149,9 @@ def print_str(s, *args, print_secrets=False):
             elif isinstance(val, cfloat):
                 val.print_float_plain()
             elif isinstance(val, (list, tuple)):
-                print_str(*_expand_to_print(val), print_secrets=print_secrets)
+                _print_list(val, print_secrets)
             elif isinstance(val, (Array, SubMultiArray)):
-                val.output(print_secrets=print_secrets)
+                _print_container(val, print_secrets)
             else:
                 try:
                     val.output()
@@ -170,21 +206,43 @@ def print_str_if(cond, ss, *args):
         assert len(subs) == len(args) + 1
         if isinstance(cond, localint):
             cond = cond._v
-        for i, s in enumerate(subs):
-            if i != 0:
-                val = args[i - 1]
-                try:
-                    val.output_if(cond)
-                except:
-                    if isinstance(val, (list, tuple, Array)):
-                        print_str_if(cond, *_expand_to_print(val))
-                    else:
-                        print_str_if(cond, str(val))
-            s = bytearray(s, 'utf8')
-            s += b'\0' * ((-len(s)) % 4)
-            while s:
-                cond.print_if(s[:4])
-                s = s[4:]
+        if any(util.is_constant(arg) for arg in args):
+            # merge compile-time constants into the literal
+            new_subs = [subs[0]]
+            new_args = []
+            for arg, s in zip(args, subs[1:]):
+                if util.is_constant(arg):
+                    new_subs[-1] += str(arg) + s
+                else:
+                    new_args.append(arg)
+                    new_subs.append(s)
+            subs, args = new_subs, new_args
+        def output_if(val):
+            try:
+                val.output_if(cond)
+            except:
+                if isinstance(val, (list, tuple, Array)):
+                    print_str_if(cond, *_expand_to_print(val))
+                else:
+                    print_str_if(cond, str(val))
+        # fragments are padded individually, so the arguments go
+        # between four-byte chunks of the concatenation
+        encoded = [_utf8_padded(s) for s in subs]
+        full = b''.join(encoded)
+        arg_offsets = []
+        off = 0
+        for s in encoded[:-1]:
+            off += len(s)
+            arg_offsets.append(off)
+        print_if = cond.print_if
+        i_arg = 0
+        for off in range(0, len(full), 4):
+            while i_arg < len(args) and arg_offsets[i_arg] == off:
+                output_if(args[i_arg])
+                i_arg += 1
+            print_if(full[off:off + 4])
+        for val in args[i_arg:]:
+            output_if(val)
 
 def print_ln_to(player, ss, *args):
     """ Print line at :py:obj:`player` only. Note that printing is
@@ -271,6 +329,10 @@ def store_in_mem(value, address):
         value.store_in_mem(address)
     except AttributeError:
         if isinstance(value, (list, tuple)):
+            if len(value) > 2 and all(type(x) is sint for x in value):
+                # single vector store
+                sint.concat(value).store_in_mem(address)
+                return
             for i, x in enumerate(value):
                 store_in_mem(x, address + i)
             return
@@ -326,13 +388,24 @@ def make_array(l, t=None):
         res = Array(len(l), t or type(l))
         res[:] = l
     else:
-        l = list(l)
-        res = Array(len(l), t or type(l[0]) if l else cint)
-        res.assign(l)
+        if hasattr(l, 'tolist'):
+            # NumPy array or array.array
+            l = l.tolist()
+        else:
+            l = list(l)
+        t = t or (type(l[0]) if l else cint)
+        res = Array(len(l), t)
+        if len(l) > 2 and t is sint and all(type(x) is sint for x in l):
+            # single vector store instead of one per element
+            res.assign_vector(sint.concat(l))
+        else:
+            res.assign(l)
     return res
 
 
 class FunctionTapeCall:
+    __slots__ = ('thread', 'base', 'bases')
+
     def __init__(self, thread, base, bases):
         self.thread = thread
         self.base = base
@@ -346,6 +419,12 @@ class FunctionTapeCall:
             instructions.program.free(self.base, 'ci')
 
 class Function:
+    __slots__ = ('last_key', 'function', 'name', 'compile_args', 'result',
+                 '_addr_pool')
+
+    # whether on_call() is done with the address array when returning
+    reuse_addresses = False
+
     def __init__(self, function, name=None, compile_args=[]):
         self.last_key = None
         self.function = function
@@ -353,13 +432,21 @@ class Function:
         if name is None:
             self.name = self.function.__name__
         self.compile_args = compile_args
+        self._addr_pool = {}
     def __call__(self, *args):
-        args = tuple(arg.read() if isinstance(arg, MemValue) else arg for arg in args)
+        # memory values can be passed directly if the function is
+        # done when returning, otherwise they are copied
+        if not self.reuse_addresses:
+            args = tuple(arg.read() if isinstance(arg, MemValue) else arg
+                         for arg in args)
         runtime_args = []
         reg_args = []
         key = self.base_key(),
         for i,arg in enumerate(args):
-            if isinstance(arg, types._vectorizable):
+            if isinstance(arg, MemValue):
+                reg_args.append(arg)
+                key += (arg.size, arg.value_type)
+            elif isinstance(arg, _vectorizable):
                 key += (arg.shape, arg.value_type)
             else:
                 arg = MemValue(arg)
@@ -384,7 +471,13 @@ class Function:
                 return self.result
             self.on_first_call(wrapped_function)
             self.last_key = key
-        addresses = regint.Array(len(runtime_args))
+        if self.reuse_addresses:
+            pool_key = self.base_key(), len(runtime_args)
+            if pool_key not in self._addr_pool:
+                self._addr_pool[pool_key] = regint.Array(len(runtime_args))
+            addresses = self._addr_pool[pool_key]
+        else:
+            addresses = regint.Array(len(runtime_args))
         for i, arg in enumerate(reg_args):
             addresses[i] = arg.address
         return self.on_call(addresses._address,
@@ -392,6 +485,8 @@ class Function:
 
 class FunctionTape(Function):
     # not thread-safe
+    __slots__ = ('single_thread', 'thread')
+
     def __init__(self, function, name=None, compile_args=[],
                  single_thread=False):
         Function.__init__(self, function, name, compile_args)
@@ -407,25 +502,47 @@ class FunctionTape(Function):
         pass
 
 class FunctionCallTape(FunctionTape):
+    __slots__ = ('instances', '_kw_order')
+
     def __init__(self, *args, **kwargs):
         super(FunctionTape, self).__init__(*args, **kwargs)
         self.instances = {}
-    @staticmethod
-    def get_key(args, kwargs):
-        key = (get_program(),)
+        self._kw_order = {}
+    def _sorted_kw_items(self, kwargs):
+        """ Keyword arguments sorted by name. The order is cached by
+        the names in call order as call sites tend to repeat. """
+        names = tuple(kwargs)
+        order = self._kw_order.get(names)
+        if order is None:
+            order = self._kw_order[names] = tuple(sorted(names))
+        return [(name, kwargs[name]) for name in order]
+    def get_key(self, args, kwargs):
+        return self._compute_key(get_program(), args,
+                                 self._sorted_kw_items(kwargs))
+    # key parts by argument type, extended by subclasses on first use
+    _key_handlers = {
+        _vectorizable: lambda arg: (arg.value_type, tuple(arg.shape)),
+        Tape.Register: lambda arg: (type(arg), arg.size),
+        list: lambda arg: (tuple(arg), 'l'),
+        object: lambda arg: (arg,),
+    }
+    @classmethod
+    def _key_handler(cls, t):
+        handler = cls._key_handlers.get(t)
+        if handler is None:
+            handler = next(cls._key_handlers[base] for base in t.__mro__
+                           if base in cls._key_handlers)
+            cls._key_handlers[t] = handler
+        return handler
+    @classmethod
+    def _compute_key(cls, program, args, kw_items):
+        key = (program,)
         def process_for_key(arg):
             nonlocal key
-            if isinstance(arg, types._vectorizable):
-                key += (arg.value_type, tuple(arg.shape))
-            elif isinstance(arg, Tape.Register):
-                key += (type(arg), arg.size)
-            elif isinstance(arg, list):
-                key += (tuple(arg), 'l')
-            else:
-                key += (arg,)
+            key += cls._key_handler(type(arg))(arg)
         for arg in args:
             process_for_key(arg)
-        for name, arg in sorted(kwargs.items()):
+        for name, arg in kw_items:
             key += (name, 'kw')
             process_for_key(arg)
         return key
@@ -441,7 +558,7 @@ class FunctionCallTape(FunctionTape):
                         call_arg(my_arg, base.vm_types[my_arg.reg_type])
                         my_args.append(my_arg)
                         return my_arg
-                    elif isinstance(arg, types._vectorizable):
+                    elif isinstance(arg, _vectorizable):
                         my_arg = arg.same_shape(address=regint())
                         my_arg.alloc_address = arg.address
                         call_arg(my_arg.address, base.vm_types['ci'])
@@ -456,7 +573,7 @@ class FunctionCallTape(FunctionTape):
                 for arg in args:
                     actual_call_args.append(process_for_call(arg))
                 actual_call_kwargs = {}
-                for name, arg in sorted(kwargs.items()):
+                for name, arg in self._sorted_kw_items(kwargs):
                     actual_call_kwargs[name] = process_for_call(arg)
                 self.result = self.function(*actual_call_args,
                                             **actual_call_kwargs)
@@ -466,8 +583,8 @@ class FunctionCallTape(FunctionTape):
                         if util.is_constant(res):
                             self.result[i] = regint(res)
             self.on_first_call(wrapped_function, key, my_args)
-        for name, arg in sorted(kwargs.items()):
-            args += arg,
+        if kwargs:
+            args += tuple(arg for name, arg in self._sorted_kw_items(kwargs))
         return self.on_call(*self.instances[key], args)
     def on_first_call(self, wrapped_function, key, inside_args):
         program = get_program()
@@ -507,7 +624,7 @@ class FunctionCallTape(FunctionTape):
                 call_args += [
                     0, instructions_base.vm_types[x.reg_type],
                     x.size, x, y]
-            elif isinstance(x, types._vectorizable):
+            elif isinstance(x, _vectorizable):
                 call_args += [0, base.vm_types['ci'], 1,
                               x.address, regint.conv(y.address)]
         call_tape(tape_handle, regint(0),
@@ -516,6 +633,8 @@ class FunctionCallTape(FunctionTape):
         return untuplify(tuple(out_result))
 
 class ExportFunction(FunctionCallTape):
+    __slots__ = ('done',)
+
     def __init__(self, function):
         super(ExportFunction, self).__init__(function)
         self.done = set()
@@ -525,7 +644,7 @@ class ExportFunction(FunctionCallTape):
         def arg_signature(arg):
             if isinstance(arg, types._structure):
                 return '%s:%d' % (arg.arg_type(), arg.size)
-            elif isinstance(arg, types._vectorizable):
+            elif isinstance(arg, _vectorizable):
                 from .GC.types import sbitvec
                 if issubclass(arg.value_type, sbitvec):
                     return 'sbv:[%dx%d]' % (arg.total_size(),
@@ -562,7 +681,7 @@ class ExportFunction(FunctionCallTape):
             for arg in self.instances[key][2]:
                 if isinstance(arg, types._structure):
                     print(arg.i, end=' ', file=out)
-                elif isinstance(arg, types._vectorizable):
+                elif isinstance(arg, _vectorizable):
                     assert util.is_constant(arg.alloc_address)
                     print(arg.alloc_address, arg.address.i, end=' ', file=out)
                 else:
@@ -606,7 +725,7 @@ def method_call_tape(function):
                 addresses = {}
                 for name, member in zip(member_key, members):
                     dummy.__dict__[name] = member
-                    if isinstance(member, types._vectorizable):
+                    if isinstance(member, _vectorizable):
                         addresses[name] = member.address
                 res = function(dummy, *real_args, **kwargs)
                 for name, member in zip(member_key, members):
@@ -616,7 +735,7 @@ def method_call_tape(function):
                     if id(new_member) != id(member):
                         raise CompilerError('cannot change members '
                                             'in method tape (%s)' % desc)
-                    if isinstance(member, types._vectorizable) and \
+                    if isinstance(member, _vectorizable) and \
                        id(new_member.address) != id(addresses[name]):
                         raise CompilerError('cannot change memory address '
                                             'in method tape (%s)' % desc)
@@ -687,6 +806,10 @@ def write_mem(dest, source):
         dest.write(source)
 
 class FunctionBlock(Function):
+    __slots__ = ('node', 'last_sub_block', 'basic_block')
+
+    reuse_addresses = True
+
     def on_first_call(self, wrapped_function):
         p_return_address = get_tape().program.malloc(1, 'ci')
         old_block = get_tape().active_basicblock
@@ -769,49 +892,96 @@ def cond_swap(x, y, key_indices=None):
         for i,j in enumerate(('v','p','z','s')):
             xx = x.__getattribute__(j)
             yy = y.__getattribute__(j)
-            bx = b * xx
-            by = b * yy
-            res[0].append(bx + yy - by)
-            res[1].append(xx - bx + by)
+            # one multiplication per component
+            d = b * (xx - yy)
+            res[0].append(yy + d)
+            res[1].append(xx - d)
         return sfloat(*res[0]), sfloat(*res[1])
     return b.cond_swap(y, x)
 
+def _row_cond_swap(key_indices):
+    """ :py:func:`cond_swap` for rows with :py:obj:`key_indices`
+    resolved once. """
+    assert len(key_indices) == 1
+    key = key_indices[0]
+    def swap(x, y):
+        b = x[key] > y[key]
+        return list(zip(*[b.cond_swap(xx, yy) for xx, yy in zip(x, y)]))
+    return swap
+
 def sort(a):
+    res = a
+
+    if len(a) > 8:
+        # Batcher's network padded to a power of two, see
+        # _odd_even_merge_sort_stages
+        tmp = list(a)
+        _apply_comparators(tmp, _odd_even_merge_sort_stages(len(tmp)))
+        res[:] = tmp
+        return res
+
     print("WARNING: you're using bubble sort")
 
-    res = a
-    
     for i in range(len(a)):
         for j in reversed(list(range(i))):
             res[j], res[j+1] = cond_swap(res[j], res[j+1])
 
     return res
 
+def _odd_even_merge_stages(n, p):
+    """ Stages of comparator index pairs of Batcher's network merging
+    sorted blocks of length :py:obj:`p` in a list of length
+    :py:obj:`n`. The comparators within a stage are independent. """
+    k = p
+    while k >= 1:
+        stage = []
+        for j in range(k % p, n - k, 2 * k):
+            for i in range(min(k, n - j - k)):
+                if (i + j) // (2 * p) == (i + j + k) // (2 * p):
+                    stage.append((i + j, i + j + k))
+        yield tuple(stage)
+        k //= 2
+
+def _odd_even_merge_sort_stages(n):
+    """ Stages of comparator index pairs of Batcher's odd-even merge
+    sort for length :py:obj:`n`. Lists not of power-of-two length are
+    considered padded with maximal values, which makes comparators
+    involving the padding redundant. Stages are generated on demand
+    to keep memory independent of the total number of comparators. """
+    n_padded = 1 << (n - 1).bit_length() if n else 0
+    p = 1
+    while p < n_padded:
+        for stage in _odd_even_merge_stages(n_padded, p):
+            stage = tuple((i, j) for i, j in stage if j < n)
+            if stage:
+                yield stage
+        p *= 2
+
+def _apply_comparators(a, stages):
+    """ Apply comparator stages to list in place. Stages on sint
+    are computed as one vectorized comparison and swap. """
+    vectorize = all(type(x) is sint and x.size == 1 for x in a)
+    for stage in stages:
+        if vectorize and len(stage) > 1:
+            x = sint.concat(a[i] for i, j in stage)
+            y = sint.concat(a[j] for i, j in stage)
+            x, y = cond_swap(x, y)
+            for k, (i, j) in enumerate(stage):
+                a[i], a[j] = x[k], y[k]
+        else:
+            for i, j in stage:
+                a[i], a[j] = cond_swap(a[i], a[j])
+
 def odd_even_merge(a):
-    if len(a) == 2:
-        a[0], a[1] = cond_swap(a[0], a[1])
-    else:
-        even = a[::2]
-        odd = a[1::2]
-        odd_even_merge(even)
-        odd_even_merge(odd)
-        a[0] = even[0]
-        for i in range(1, len(a) // 2):
-            a[2*i-1], a[2*i] = cond_swap(odd[i-1], even[i])
-        a[-1] = odd[-1]
+    _apply_comparators(a, _odd_even_merge_stages(len(a), len(a) // 2))
 
 def odd_even_merge_sort(a):
-    if len(a) == 1:
+    if len(a) <= 1:
         return
-    elif len(a) % 2 == 0:
+    elif len(a) & (len(a) - 1) == 0:
         aa = a
         a = list(a)
-        lower = a[:len(a)//2]
-        upper = a[len(a)//2:]
-        odd_even_merge_sort(lower)
-        odd_even_merge_sort(upper)
-        a[:] = lower + upper
-        odd_even_merge(a)
+        _apply_comparators(a, _odd_even_merge_sort_stages(len(a)))
         aa[:] = a
     else:
         raise CompilerError('Length of list must be power of two')
@@ -829,56 +999,125 @@ def loopy_chunkier_odd_even_merge_sort(a, n=None, max_chunk_size=512, n_threads=
         'This function has been removed, use loopy_odd_even_merge_sort instead')
 
 
+@lru_cache(maxsize=16)
+def _odd_even_schedule(n, sorted_length=1):
+    """ Layers :math:`(l, k, n_{innermost})` of
+    :py:func:`loopy_odd_even_merge_sort` for length :py:obj:`n`. """
+    res = []
+    # aligned blocks of the largest power of two dividing sorted_length
+    # lie within sorted runs, so they are sorted as well
+    l = sorted_length & -sorted_length
+    while l < n:
+        l <<= 1
+        for lvl in range(1, l.bit_length()):
+            k = 1 << lvl
+            res.append((l, k, 1 if k == 2 else k // 2 - 1))
+    return tuple(res)
+
+def _odd_even_merge_layer(a, m, l, k, key_indices=None):
+    """ Layer of :py:func:`loopy_odd_even_merge_sort` as one vectorized
+    comparison on an array padded to length :math:`m` (a power of two).
+    Matrix rows are compared by the single column in
+    :py:obj:`key_indices`. """
+    step = l // k
+    n_innermost = 1 if k == 2 else k // 2 - 1
+    # skip blocks of length l entirely in the padding
+    size = min(m, -(-len(a) // l) * l) // k * n_innermost
+    offset = 0 if k == 2 else step
+    lower = regint.inc(size, offset, l, n_innermost * step) + \
+        regint.inc(size, 0, 1, n_innermost, step) + \
+        regint.inc(size, 0, 2 * step, 1, n_innermost)
+    upper = lower + step
+    if len(a) < m:
+        # ignore comparators involving the padding
+        go = upper < len(a)
+        x, y = cond_swap(a.maybe_get_vector(go, lower),
+                         a.maybe_get_vector(go, upper))
+        a.maybe_set_vector(go, lower, x)
+        a.maybe_set_vector(go, upper, y)
+        return
+    base = regint.inc(size, a.address, 0)
+    if key_indices is None:
+        x, y = cond_swap(a.get(lower), a.get(upper))
+        x.store_in_mem(base + lower)
+        y.store_in_mem(base + upper)
+        return
+    n_cols = a.sizes[1]
+    lower = base + lower * n_cols
+    upper = base + upper * n_cols
+    load = lambda addresses, j: a.value_type.load_mem(addresses + j, size=size)
+    b = load(lower, key_indices[0]) > load(upper, key_indices[0])
+    for j in range(n_cols):
+        x, y = b.cond_swap(load(lower, j), load(upper, j))
+        x.store_in_mem(lower + j)
+        y.store_in_mem(upper + j)
+
 def loopy_odd_even_merge_sort(a, sorted_length=1, n_parallel=32,
                               n_threads=None, key_indices=None):
     get_program().reading('sorting', 'KSS13')
+    n = len(a)
+    if sorted_length >= n:
+        # nothing to merge
+        return
     a_in = a
     if isinstance(a_in, list):
         a = Array.create_from(a)
+    m = 1 << (n - 1).bit_length() if n > 1 else 1
+    # whole layers at once unless threads are requested
+    if isinstance(a, Array):
+        vectorized = key_indices is None
+    else:
+        vectorized = isinstance(a, SubMultiArray) and len(a.sizes) == 2 \
+            and len(key_indices) == 1 and isinstance(key_indices[0], int)
+    vectorized &= n_threads is None and (m == n or key_indices is None) \
+        and issubclass(a.value_type, (sint, sfix))
+    if not isinstance(a, Array) and key_indices is not None:
+        swap_rows = _row_cond_swap(key_indices)
+    else:
+        swap_rows = cond_swap
     steps = {}
-    l = sorted_length
-    while l < len(a):
-        l *= 2
-        k = 1
-        while k < l:
-            k *= 2
-            n_innermost = 1 if k == 2 else k // 2 - 1
-            key = k
-            if key not in steps:
-                @function_block
-                def step(l):
-                    l = MemValue(l)
-                    m = 2 ** int(math.ceil(math.log(len(a), 2)))
-                    @for_range_opt_multithread(n_threads, m // k)
-                    def _(i):
-                        n_inner = l // k
-                        j = i % n_inner
-                        i //= n_inner
-                        base = i*l + j
-                        step = l//k
-                        def swap(base, step):
-                            if m == len(a):
-                                a[base], a[base + step] = \
-                                    cond_swap(a[base], a[base + step],
-                                              key_indices=key_indices)
-                            else:
-                                # ignore values outside range
-                                go = base + step < len(a)
-                                x = a.maybe_get(go, base)
-                                y = a.maybe_get(go, base + step)
-                                tmp = cond_swap(x, y, key_indices=key_indices)
-                                for i, idx in enumerate((base, base + step)):
-                                    a.maybe_set(go, idx, tmp[i])
-                        if k == 2:
-                            swap(base, step)
+    for l, k, n_innermost in _odd_even_schedule(n, sorted_length):
+        if vectorized:
+            # indirect memory access is not ordered within a block
+            break_point('odd-even-layer')
+            _odd_even_merge_layer(a, m, l, k, key_indices)
+            continue
+        if k not in steps:
+            # one block per k, l is passed at run time
+            @function_block_with_compile_args(k, n_innermost)
+            def step(k, n_innermost, l):
+                l = MemValue(l)
+                @for_range_opt_multithread(n_threads, m // k)
+                def _(i):
+                    n_inner = l // k
+                    j = i % n_inner
+                    i //= n_inner
+                    base = i*l + j
+                    step = l//k
+                    def swap(base, step):
+                        if m == n:
+                            a[base], a[base + step] = \
+                                swap_rows(a[base], a[base + step])
                         else:
-                            @for_range_opt(n_innermost)
-                            def f(i):
-                                m1 = step + i * 2 * step
-                                m2 = m1 + base
-                                swap(m2, step)
-                steps[key] = step
-            steps[key](l)
+                            # ignore values outside range
+                            go = base + step < n
+                            x = a.maybe_get(go, base)
+                            y = a.maybe_get(go, base + step)
+                            tmp = swap_rows(x, y)
+                            for i, idx in enumerate((base, base + step)):
+                                a.maybe_set(go, idx, tmp[i])
+                    if k == 2:
+                        swap(base, step)
+                    else:
+                        @for_range_opt(n_innermost)
+                        def f(i):
+                            m1 = step + i * 2 * step
+                            m2 = m1 + base
+                            swap(m2, step)
+            steps[k] = step
+        steps[k](l)
+    if vectorized:
+        break_point('odd-even-layer')
     if isinstance(a_in, list):
         a_in[:] = list(a)
 
@@ -887,32 +1126,47 @@ def mergesort(A):
         raise CompilerError('mergesort reveals the order of elements, '
                             'use --insecure to activate it')
 
-    B = Array(len(A), sint)
+    n = len(A)
+    if n <= 1:
+        return
+    B = Array(n, sint)
 
-    def merge(i_left, i_right, i_end):
+    def merge(src, dst, i_left, i_right, i_end):
         i0 = MemValue(i_left)
         i1 = MemValue(i_right)
-        @for_range(i_left, i_end)
+        @for_range_opt(i_left, i_end)
         def loop(j):
-            if_then(and_(lambda: i0 < i_right,
-                         or_(lambda: i1 >= i_end,
-                             lambda: regint(reveal(A[i0] <= A[i1])))))
-            B[j] = A[i0]
-            i0.iadd(1)
-            else_then()
-            B[j] = A[i1]
-            i1.iadd(1)
-            end_if()
-
+            left = i0 < i_right
+            right = i1 < i_end
+            # indices of exhausted halves are clamped to stay in range,
+            # the comparison is ignored for them
+            less = regint(reveal(src[left * i0] <= src[right * i1]))
+            # take from the left unless exhausted or larger
+            take_left = left * (1 - right * (1 - less))
+            dst[j] = src[take_left.if_else(i0, i1)]
+            i0.iadd(take_left)
+            i1.iadd(1 - take_left)
+
+    # alternate between A and B instead of copying back after each pass
+    src_address = MemValue(regint(A.address))
+    dst_address = MemValue(regint(B.address))
     width = MemValue(1)
     @do_while
     def width_loop():
-        @for_range(0, len(A), 2 * width)
+        src = Array(n, sint, src_address.read())
+        dst = Array(n, sint, dst_address.read())
+        @for_range(0, n, 2 * width)
         def merge_loop(i):
-            merge(i, i + width, i + 2 * width)
-        A.assign(B)
+            i_right = i + width
+            i_end = i_right + width
+            merge(src, dst, i, (i_right < n).if_else(i_right, n),
+                  (i_end < n).if_else(i_end, n))
+        src_address.write(dst.address)
+        dst_address.write(src.address)
         width.imul(2)
-        return width < len(A)
+        return width < n
+    if max(1, (n - 1).bit_length()) % 2:
+        A.assign_vector(B.get_vector())
 
 def _range_prep(start, stop, step):
     if stop is None:
@@ -926,10 +1180,34 @@ def _range_prep(start, stop, step):
     stop = type(stop)(stop)
     return start, stop, step
 
+def _range_loop_int(loop_body, start, stop, step):
+    """ :py:func:`range_loop` for compile-time bounds and positive
+    step without the generic condition closures. """
+    if start >= stop:
+        return
+    i = regint(start)
+    def loop_fn():
+        res = loop_body(i)
+        if res is None:
+            res = i + step
+        else:
+            res = util.if_else(res == 0, stop, i + step)
+        i.link(regint(res))
+        return res < stop
+    do_while(loop_fn, g=loop_body.__globals__)
+    # known loop count
+    get_block().req_node.children[-1].aggregator = \
+        lambda x: int(ceil(((stop - start) / step))) * x[0]
+
 def range_loop(loop_body, start, stop=None, step=None):
     start, stop, step = _range_prep(start, stop, step)
+    if isinstance(start, int) and isinstance(stop, int) \
+       and isinstance(step, int) and step > 0:
+        return _range_loop_int(loop_body, start, stop, step)
     def loop_fn(i):
         res = loop_body(i)
+        if res is None:
+            return i + step
         return util.if_else(res == 0, stop, i + step)
     if isinstance(step, int):
         if step > 0:
@@ -1062,8 +1340,11 @@ def for_range_opt(start, stop=None, step=None, budget=None):
         return for_range_opt_multithread(None, n_loops)
     return map_reduce_single(None, n_loops, budget=budget)
 
-def map_reduce_single(n_parallel, n_loops, initializer=lambda *x: [],
-                      reducer=lambda *x: [], mem_state=None, budget=None):
+def _no_state(*args):
+    return []
+
+def map_reduce_single(n_parallel, n_loops, initializer=_no_state,
+                      reducer=_no_state, mem_state=None, budget=None):
     budget = budget or get_program().budget
     if not (isinstance(n_parallel, int) or n_parallel is None):
         raise CompilerError('Number of parallel executions must be constant')
@@ -1079,6 +1360,14 @@ def map_reduce_single(n_parallel, n_loops, initializer=lambda *x: [],
         budget //= 10
         n_loops = regint(n_loops)
     def decorator(loop_body):
+        if reducer is _no_state:
+            # plain loop, nothing to collect
+            def run(j, state):
+                loop_body(j)
+                return state
+        else:
+            def run(j, state):
+                return reducer(tuplify(loop_body(j)), state)
         my_n_parallel = n_parallel
         if isinstance(n_parallel, int):
             if isinstance(n_loops, int):
@@ -1102,7 +1391,7 @@ def map_reduce_single(n_parallel, n_loops, initializer=lambda *x: [],
                 j = i * n_parallel
                 one = regint(1)
                 for k in range(n_parallel):
-                    state = reducer(tuplify(loop_body(j)), state)
+                    state = run(j, state)
                     j += one
                 if n_parallel > 1 and start_block != get_block():
                     print('WARNING: parallelization broken '
@@ -1118,20 +1407,21 @@ def map_reduce_single(n_parallel, n_loops, initializer=lambda *x: [],
             prevent_breaks = get_program().prevent_breaks
             get_program().prevent_breaks = False
             get_program().reading('loop optimization', 'Keller24')
+            opt_blocks = []
             @while_do(lambda x: x + n_opt_loops_reg <= n_loops, regint(0))
             def _(i):
                 state = tuplify(initializer())
                 k = 0
                 block = get_block()
+                opt_blocks.append(block)
                 assert not isinstance(n_loops, int) or n_loops > 0
-                pre = copy.copy(loop_body.__globals__)
+                pre = _snapshot(loop_body.__globals__)
                 while (not util.is_constant(n_loops) or k < n_loops) \
                       and (len(get_block()) < budget or k == 0) \
                       and block is get_block():
                     j = i + k
-                    state = reducer(tuplify(loop_body(j)), state)
+                    state = run(j, state)
                     k += 1
-                RegintOptimizer().run(block.instructions, get_program())
                 _link(pre, loop_body.__globals__)
                 r = reducer(mem_state, state)
                 write_state_to_memory(r)
@@ -1167,6 +1457,9 @@ def map_reduce_single(n_parallel, n_loops, initializer=lambda *x: [],
                 RegintOptimizer().run(merged.instructions, get_program())
                 get_tape().active_basicblock = merged
             else:
+                # only once the unrolled body is complete
+                RegintOptimizer().run(opt_blocks[0].instructions,
+                                      get_program())
                 if get_program().verbose:
                     print(n_opt_loops, 'repetitions')
                 assert not get_program().prevent_breaks
@@ -1176,16 +1469,16 @@ def map_reduce_single(n_parallel, n_loops, initializer=lambda *x: [],
         if isinstance(n_loops, int):
             state = mem_state
             for j in range(loop_rounds * my_n_parallel, n_loops):
-                state = reducer(tuplify(loop_body(j)), state)
+                state = run(j, state)
         else:
             done = regint(loop_rounds * my_n_parallel)
-            for i in range(int(math.log(my_n_parallel, 2)), -1, -1):
+            for i in range(my_n_parallel.bit_length() - 1, -1, -1):
                 N = 2 ** i
                 @if_(n_loops - done >= N)
                 def _():
                     state = tuplify(initializer())
                     for j in range(N):
-                        state = reducer(tuplify(loop_body(done + j)), state)
+                        state = run(done + j, state)
                     write_state_to_memory(reducer(mem_state, state))
                     done.iadd(N)
             state = mem_state
@@ -1214,7 +1507,7 @@ def for_range_multithread(n_threads, n_parallel, n_loops, thread_mem_req={},
 
     """
     return map_reduce(n_threads, n_parallel, n_loops, \
-                          lambda *x: [], lambda *x: [], thread_mem_req,
+                          _no_state, _no_state, thread_mem_req,
                       budget=budget)
 
 def for_range_opt_multithread(n_threads, n_loops, budget=None):
@@ -1287,9 +1580,16 @@ def multithread(n_threads, n_items=None, max_size=None):
         def wrapper(function):
             @multithread(n_threads, n_items)
             def new_function(base, size):
-                @for_range(size // max_size)
-                def _(i):
-                    function(base + i * max_size, max_size)
+                n_chunks = size // max_size
+                # Only a known count of at most one full chunk avoids
+                # the loop. Unrolling more chunks would multiply the
+                # code that max_size is meant to bound.
+                if util.is_one(n_chunks):
+                    function(base, max_size)
+                elif not util.is_zero(n_chunks):
+                    @for_range(n_chunks)
+                    def _(i):
+                        function(base + i * max_size, max_size)
                 rem = size % max_size
                 if rem:
                     function(base + size - rem, rem)
@@ -1301,13 +1601,13 @@ def map_reduce(n_threads, n_parallel, n_loops, initializer, reducer, \
     if isinstance(n_loops, (list, tuple)):
         split = n_loops
         n_loops = reduce(operator.mul, n_loops)
+        strides = [1]
+        for n in reversed(split[1:]):
+            strides.insert(0, strides[0] * n)
         def decorator(loop_body):
             def new_body(i):
-                indices = []
-                for n in reversed(split):
-                    indices.insert(0, i % n)
-                    i //= n
-                return loop_body(*indices)
+                return loop_body(*(i % n if s == 1 else i // s % n
+                                   for s, n in zip(strides, split)))
             return new_body
         new_dec = map_reduce(n_threads, n_parallel, n_loops, initializer, reducer, thread_mem_req)
         return lambda loop_body: new_dec(decorator(loop_body))
@@ -1339,35 +1639,54 @@ def map_reduce(n_threads, n_parallel, n_loops, initializer, reducer, \
         else:
             state_type = type(state)
         prevent_breaks = get_program().prevent_breaks
-        def f(inc):
+        def f(inc=None):
             get_program().prevent_breaks = prevent_breaks
             base = args[get_arg()][0]
             get_program().base_addresses[base] = None
+            n_rounds = thread_rounds
             if not util.is_constant(thread_rounds):
                 i = base // thread_rounds
                 overhang = n_loops % n_threads
                 inc = i < overhang
                 base += inc.if_else(i, overhang)
+                n_rounds = thread_rounds + inc
+            elif inc is None:
+                # the first threads run one more round
+                inc = get_arg() < remainder if remainder else 0
             if not looping:
                 return loop_body(base, thread_rounds + inc)
             if thread_mem_req:
                 thread_mem = Array(thread_mem_req[regint], regint, \
                                        args[get_arg()].address + 2)
-            mem_state = Array(len(state), state_type, args[get_arg()][1])
-            @map_reduce_single(n_parallel, thread_rounds + inc, \
-                                   initializer, reducer, mem_state)
-            def f(i):
+            def body(i):
                 if thread_mem_req:
                     return loop_body(base + i, thread_mem)
                 else:
                     return loop_body(base + i)
+            mem_state = Array(len(state), state_type, args[get_arg()][1])
+            map_reduce_single(n_parallel, n_rounds, initializer, reducer,
+                              mem_state)(body)
+            if remainder:
+                @if_(inc)
+                def _():
+                    r = reducer(tuplify(body(thread_rounds)),
+                                tuplify(initializer()))
+                    mem_state.assign(reducer(mem_state, r))
         prog = get_program()
         thread_args = []
         if prog.curr_tape.singular:
             prog.n_running_threads = n_threads
+        prog.prevent_breaks = False
+        if looping:
+            tape = tape1 = prog.new_tape(f, name='multithread')
+        else:
+            # sizes have to be known at compile time
+            if not util.is_zero(thread_rounds):
+                tape = prog.new_tape(f, (0,), 'multithread')
+            if remainder:
+                prog.prevent_breaks = False
+                tape1 = prog.new_tape(f, (1,), 'multithread1')
         if not util.is_zero(thread_rounds):
-            prog.prevent_breaks = False
-            tape = prog.new_tape(f, (0,), 'multithread')
             for i in range(n_threads - remainder):
                 mem_state = make_array(initializer())
                 args[remainder + i][0] = i * thread_rounds
@@ -1375,8 +1694,6 @@ def map_reduce(n_threads, n_parallel, n_loops, initializer, reducer, \
                     args[remainder + i][1] = mem_state.address
                 thread_args.append((tape, remainder + i))
         if remainder:
-            prog.prevent_breaks = False
-            tape1 = prog.new_tape(f, (1,), 'multithread1')
             for i in range(remainder):
                 mem_state = make_array(initializer())
                 args[i][0] = (n_threads - remainder + i) * thread_rounds + i
@@ -1462,7 +1779,7 @@ def map_sum_simple(n_threads, n_loops, type, size):
         for i in (0, 1):
             assert len(args[i]) == size
             if isinstance(args[i], Array):
-                args[i] = args[i][:]
+                args[i] = args[i].get_vector()
         return args[0] + args[1]
     return map_reduce(n_threads, 1, n_loops, initializer, summer)
 
@@ -1479,7 +1796,8 @@ def tree_reduce_multithread(n_threads, function, vector):
     """
     inputs = vector.Array(len(vector))
     inputs.assign_vector(vector)
-    outputs = vector.Array(len(vector) // 2)
+    # alternate between the buffers instead of copying back
+    outputs = vector.Array((len(vector) + 1) // 2)
     left = len(vector)
     while left > 1:
         @multithread(n_threads, left // 2)
@@ -1487,9 +1805,9 @@ def tree_reduce_multithread(n_threads, function, vector):
             outputs.assign_vector(
                 function(inputs.get_vector(2 * base, size),
                          inputs.get_vector(2 * base + size, size)), base)
-        inputs.assign_vector(outputs.get_vector(0, left // 2))
         if left % 2 == 1:
-            inputs[left // 2] = inputs[left - 1]
+            outputs[left // 2] = inputs[left - 1]
+        inputs, outputs = outputs, inputs
         left = (left + 1) // 2
     return inputs[0]
 
@@ -1574,39 +1892,49 @@ def while_do(condition, *args):
         return loop_body
     return decorator
 
+class _ReadOnlyList(list):
+    def __setitem__(*args):
+        raise Exception('you cannot change lists in branches, '
+                        'use Array or MultiArray instead')
+    __delitem__ = append = clear = extend = insert = __setitem__
+    pop = remove = reverse = sort = __iadd__ = __imul__ = __setitem__
+
 def _run_and_link(function, g=None, lock_lists=True, allow_return=False):
+    locked = {}
     if g is None:
         g = function.__globals__
         if lock_lists:
-            class A(list):
-                def __init_(self, l):
-                    self[:] = l
-                def __setitem__(*args):
-                    raise Exception('you cannot change lists in branches, '
-                                    'use Array or MultiArray instead')
-                __delitem__ = append = clear = extend = insert = __setitem__
-                pop = remove = reverse = sort = __setitem__
-            for x in g:
-                if isinstance(g[x], list):
-                    g[x] = A(g[x])
-    pre = copy.copy(g)
+            for x, l in g.items():
+                if isinstance(l, list) and not isinstance(l, _ReadOnlyList):
+                    locked[x] = l
+            for x, l in locked.items():
+                g[x] = _ReadOnlyList(l)
+    pre = _snapshot(g)
     res = function()
+    # unlock lists outside the outermost block
+    for x, l in locked.items():
+        if isinstance(g.get(x), _ReadOnlyList):
+            g[x] = l
     if res is not None and not allow_return:
         raise CompilerError('Conditional blocks cannot return values. '
                             'Use if_else instead: https://mp-spdz.readthedocs.io/en/latest/Compiler.html#Compiler.types.regint.if_else')
     _link(pre, g)
     return res
 
+def _snapshot(g):
+    """ Variables in :py:obj:`g` that :py:func:`_link` might have to
+    link after running a block. """
+    return {name: var for name, var in g.items()
+            if isinstance(var, (Tape.Register, _single, _vec))}
+
 def _link(pre, g):
     if g:
-        from .types import _single
         for name, var in pre.items():
-            if isinstance(var, (Tape.Register, _single, _vec)):
-                new_var = g[name]
-                if util.is_constant_float(new_var):
-                    raise CompilerError('cannot reassign constants in blocks')
-                if id(new_var) != id(var):
-                    new_var.link(new_var.conv(var))
+            new_var = g[name]
+            if util.is_constant_float(new_var):
+                raise CompilerError('cannot reassign constants in blocks')
+            if id(new_var) != id(var):
+                new_var.link(new_var.conv(var))
 
 def do_while(loop_fn, g=None):
     """ Do-while loop. The loop is stopped if the return value is zero.
@@ -1639,7 +1967,21 @@ def do_while(loop_fn, g=None):
 def break_loop():
     """ Break out of loop. """
     get_tape().loop_breaks[-1].append(get_block())
-    break_point('break')
+    get_tape().start_new_basicblock(name='break')
+
+def _constant_condition(condition):
+    """ Truth value of condition if known at compile time, None otherwise.
+    Clear registers count if loaded from an immediate in the current
+    block and never linked since. """
+    if isinstance(condition, (regint, cint)):
+        if condition.size == 1 and condition.constant is not None and \
+           condition.block is get_block():
+            return bool(condition.constant)
+        return None
+    try:
+        return bool(condition)
+    except:
+        return None
 
 def if_then(condition):
     class State: pass
@@ -1659,7 +2001,7 @@ def if_then(condition):
                                                    name='if-block')
     state.has_else = False
     state.closed_if = False
-    state.caller = [frame[1:] for frame in inspect.stack()[1:]]
+    state.caller = util.call_stack()
     instructions.program.curr_tape.if_states.append(state)
 
 def else_then():
@@ -1683,8 +2025,8 @@ def end_if():
         state = instructions.program.curr_tape.if_states.pop()
     except IndexError:
         raise CompilerError('No open if/else block')
-    branch = instructions.jmpeqz(regint.conv(state.condition), 0, \
-                                     add_to_prog=False)
+    # already converted in if_then()
+    branch = instructions.jmpeqz(state.condition, 0, add_to_prog=False)
     # start next block
     get_tape().close_scope(state.start_block, state.req_child.parent, 'end-if')
     if state.has_else:
@@ -1700,6 +2042,10 @@ def end_if():
         state.req_child.aggregator = lambda x: x[0]
 
 def if_statement(condition, if_fn, else_fn=None):
+    if not callable(condition):
+        constant = _constant_condition(condition)
+        if constant is not None:
+            condition = constant
     if condition is True or condition is False:
         # condition known at compile time
         if condition:
@@ -1735,10 +2081,9 @@ def if_(condition):
             ...
 
     """
-    try:
-        condition = bool(condition)
-    except:
-        pass
+    constant = _constant_condition(condition)
+    if constant is not None:
+        condition = constant
     def decorator(body):
         if isinstance(condition, bool):
             if condition:
@@ -1769,10 +2114,9 @@ def if_e(condition):
         def _():
             y.write(0)
     """
-    try:
-        condition = bool(condition)
-    except:
-        pass
+    constant = _constant_condition(condition)
+    if constant is not None:
+        condition = constant
     def decorator(body):
         if isinstance(condition, bool):
             get_tape().if_states.append(condition)
@@ -1797,8 +2141,26 @@ def else_(body):
         _run_and_link(body)
         end_if()
 
-def and_(*terms):
+def _is_zero_terms(terms, zero):
+    """ regint truth values of term() == 0 for all terms """
+    return [regint.conv(term()) == zero for term in terms]
+
+def and_(*terms, short_circuit=False):
+    """ Conjunction of callables returning regint/cint/int.
+
+    All terms are evaluated by default. Pass ``short_circuit=True``
+    for the previous behaviour if later terms must not run or are
+    expensive, for example when they access memory at an index that
+    is only valid if the earlier terms hold.
+
+    :param short_circuit: only evaluate terms as long as all previous
+      ones are true (requires a branch per term, default: false) """
     def load_result():
+        if not short_circuit:
+            # share constants between terms
+            zero, one = regint(0), regint(1)
+            factors = [one - x for x in _is_zero_terms(terms, zero)]
+            return reduce(operator.mul, factors) if factors else one
         res = regint(0)
         for term in terms:
             if_then(term())
@@ -1811,8 +2173,19 @@ def and_(*terms):
         return res
     return load_result
 
-def or_(*terms):
+def or_(*terms, short_circuit=False):
+    """ Disjunction of callables returning regint/cint/int.
+
+    All terms are evaluated by default, see :py:func:`and_`.
+
+    :param short_circuit: only evaluate terms as long as all previous
+      ones are false (requires a branch per term, default: false) """
     def load_result():
+        if not short_circuit:
+            # De Morgan, share constants between terms
+            zero, one = regint(0), regint(1)
+            factors = _is_zero_terms(terms, zero)
+            return one - reduce(operator.mul, factors) if factors else zero
         res = regint(1)
         for term in terms:
             if_then(term())
@@ -1834,7 +2207,7 @@ def start_timer(timer_id=0):
     already running.
 
     :param timer_id: compile-time (int) """
-    get_tape().start_new_basicblock(name='pre-start-timer')
+    get_tape().start_new_basicblock(name='pre-start-timer', reuse_empty=True)
     start(timer_id)
     get_tape().start_new_basicblock(name='post-start-timer')
 
@@ -1842,7 +2215,7 @@ def stop_timer(timer_id=0):
     """ Stop timer. Fails if not running.
 
     :param timer_id: compile-time (int) """
-    get_tape().start_new_basicblock(name='pre-stop-timer')
+    get_tape().start_new_basicblock(name='pre-stop-timer', reuse_empty=True)
     stop(timer_id)
     get_tape().start_new_basicblock(name='post-stop-timer')
 
@@ -1888,17 +2261,16 @@ def accept_client_connection(port, players=None):
     :returns: client id
 
     """
-    res = regint()
     if players is None:
+        res = regint()
         instructions.acceptclientconnection(res, regint.conv(port))
     else:
-        @if_e(sum(regint(players) ==
+        # accepting blocks, so it cannot be replaced by a selection
+        res = regint(-1)
+        @if_(sum(regint(players) ==
                  get_player_id()._v.expand_to_vector(len(players))))
         def _():
             res.update(accept_client_connection(port))
-        @else_
-        def _():
-            res.update(-1)
     return res
 
 def init_client_connection(host, port, my_id, relative_port=True):
@@ -1925,7 +2297,7 @@ def break_point(name=''):
 
     :param name: Name for identification (optional)
     """
-    get_tape().start_new_basicblock(name=name)
+    get_tape().start_new_basicblock(name=name, reuse_empty=True)
 
 def check_point():
     """
@@ -1946,32 +2318,21 @@ def approximate_reciprocal(divisor, k, f, theta):
         returns aproximation of 1/divisor
         where type(divisor) = cint
     """
-    def twos_complement(x):
-        bits = x.bit_decompose(k)[::-1]
-
-        twos_result = cint(0)
-        for i in range(k):
-            val = twos_result
-            val <<= 1
-            val += 1 - bits[i]
-            twos_result = val
-
-        return twos_result + 1
-
     bits = divisor.bit_decompose(k)[::-1]
 
     flag = regint(0)
     cnt_leading_zeros = regint(0)
-    normalized_divisor = divisor
 
     for i in range(k):
         flag = flag | bits[i]
-        flag_zero = flag.bit_not()
-        cnt_leading_zeros += flag_zero
-        normalized_divisor <<= flag_zero
+        cnt_leading_zeros += flag.bit_not()
+
+    # shift once, the normalized divisor has exactly k bits
+    normalized_divisor = divisor << cnt_leading_zeros
 
     q = two_power(k)
-    e = twos_complement(normalized_divisor)
+    # two's complement in k bits
+    e = q - normalized_divisor
 
     for i in range(theta):
         q += (q * e) >> k
@@ -1982,6 +2343,23 @@ def approximate_reciprocal(divisor, k, f, theta):
     return res
 
 
+def _goldschmidt(a, b, w, theta, f, mul):
+    """
+        Goldschmidt iterations for a/b starting from an approximation w
+        of 1/b. As in FPDiv, only the error x = 1 - b*w is tracked since
+        the next factor is 1 + x and the error squares in every step.
+        mul(y, z) has to return y * z with f bits truncated.
+    """
+    one = two_power(f)
+    corr = two_power(f - 1)
+    x = one - ((b * w + corr) >> f)
+    a = mul(a, w)
+    for i in range(theta - 1):
+        a = mul(a, one + x)
+        if i < theta - 2:
+            x = (x * x + corr) >> f
+    return a
+
 def cint_cint_division(a, b, k, f):
     """
         Goldschmidt method implemented with
@@ -1995,7 +2373,6 @@ def cint_cint_division(a, b, k, f):
         assert 2 * f < int(get_program().options.ring)
 
     theta = int(ceil(log(k/3.5) / log(2)))
-    two = cint(2) * two_power(f)
 
     sign_b = cint(1) - 2 * cint(b.less_than(0, k, sync=False))
     sign_a = cint(1) - 2 * cint(a.less_than(0, k, sync=False))
@@ -2003,16 +2380,9 @@ def cint_cint_division(a, b, k, f):
     absolute_a = a * sign_a
     w0 = approximate_reciprocal(absolute_b, k, f, theta)
 
-    A = absolute_a
-    B = absolute_b
-    W = w0
-
-    corr = cint(1) << (f - 1)
-
-    for i in range(theta):
-        A = (A * W + corr) >> f
-        B = (B * W + corr) >> f
-        W = two - B
+    corr = two_power(f - 1)
+    A = _goldschmidt(absolute_a, absolute_b, w0, theta, f,
+                     lambda y, z: (y * z + corr) >> f)
     return (sign_a * sign_b) * A
 
 from Compiler.program import Program
@@ -2023,22 +2393,15 @@ def sint_cint_division(a, b, k, f, nearest=False):
         type(a) = sint, type(b) = cint
     """
     theta = int(ceil(log(k/3.5) / log(2)))
-    two = cint(2) * two_power(f)
     sign_b = cint(1) - 2 * cint(b.less_than(0, k))
     sign_a = sint(1) - 2 * comparison.LessThanZero(a, k)
     absolute_b = b * sign_b
     absolute_a = a * sign_a
     w0 = approximate_reciprocal(absolute_b, k, f, theta)
 
-    A = absolute_a
-    B = absolute_b
-    W = w0
-
-    for i in range(1, theta):
-        A = (A * W).round(2 * k, f, nearest=nearest, signed=True)
-        temp = (B * W + 2 * (f - 1)) >> f
-        W = two - temp
-        B = temp
+    A = _goldschmidt(
+        absolute_a, absolute_b, w0, theta - 1, f,
+        lambda y, z: (y * z).round(2 * k, f, nearest=nearest, signed=True))
     return (sign_a * sign_b) * A
 
 def IntDiv(a, b, k):
@@ -2095,18 +2458,28 @@ def FPDiv(a, b, k, f, simplex_flag=False, nearest=False):
     y = a.extend(l_y) * w
     y = y.round(l_y, f, nearest, signed=True)
 
+    # bit widths of x and y, extending is not free with binary types
+    x_width, y_width = 2 * k, l_y - f
+
     for i in range(theta - 1):
-        x = x.extend(2 * k)
-        y = y.extend(l_y) * (alpha + x).extend(l_y)
+        x = _extend(x, x_width, 2 * k)
+        y = _extend(y, y_width, l_y) * _extend(alpha + x, 2 * k, l_y)
         x = x * x
         y = y.round(l_y, 2*f, nearest, signed=True)
         x = x.round(2*k, 2*f, nearest, signed=True)
+        x_width, y_width = 2 * k - 2 * f, l_y - 2 * f
 
-    x = x.extend(2 * k)
-    y = y.extend(l_y) * (alpha + x).extend(l_y)
+    x = _extend(x, x_width, 2 * k)
+    y = _extend(y, y_width, l_y) * _extend(alpha + x, 2 * k, l_y)
     y = y.round(l_y, 3 * f - res_f, nearest, signed=True)
     return y
 
+def _extend(x, width, target):
+    """ Extend x from width to target bits unless they already match. """
+    if width == target:
+        return x
+    return x.extend(target)
+
 @instructions_base.ret_cisc
 def AppRcr(b, k, f, simplex_flag=False, nearest=False):
     """
@@ -2141,12 +2514,10 @@ def Norm(b, k, f, simplex_flag=False):
     bits = absolute_val.bit_decompose(k, maybe_mixed=True)[::-1]
     suffixes = PreOR(bits)[::-1]
 
-    z = [0] * k
-    for i in range(k - 1):
-        z[i] = suffixes[i] - suffixes[i+1]
-    z[k - 1] = suffixes[k-1]
-
-    acc = b.bit_compose(reversed(z))
+    # acc is bit_compose(reversed(z)) for z[i] = suffixes[i] - suffixes[i+1]
+    # (z[k-1] = suffixes[k-1]), which telescopes to the following
+    acc = (b.conv(suffixes[0]) << (k - 1)) - \
+        b.bit_compose(reversed(suffixes[1:]))
 
     part_reciprocal = absolute_val * acc
     signed_acc = sign * acc
@@ -1040,7 +1040,8 @@ class Tape:
             self._is_empty = len(self.basicblocks) == 0
         return self._is_empty
 
-    def start_new_basicblock(self, scope=False, name="", req_node=None):
+    def start_new_basicblock(self, scope=False, name="", req_node=None,
+                             reuse_empty=False):
         assert not self.program.prevent_breaks
         if self.program.verbose and self.active_basicblock and \
            self.program.allocated_mem != self.old_allocated_mem:
@@ -1056,6 +1057,12 @@ class Tape:
             scope = self.active_basicblock
         suffix = "%s-%d" % (name, self.block_counter)
         self.block_counter += 1
+        # an empty block already separates what comes before and after,
+        # unless the caller holds on to it for control flow
+        if reuse_empty and not self.active_basicblock.instructions and \
+           scope is self.active_basicblock and req_node is None:
+            self.active_basicblock.name = self.name + "-" + suffix
+            return
         if req_node is None:
             req_node = self.active_basicblock.req_node
         sub = self.BasicBlock(self, self.name + "-" + suffix, scope,
@@ -1663,6 +1670,7 @@ class Tape:
             "duplicates",
             "dup_count",
             "block",
+            "constant",
         ]
         maximum_size = 2 ** (64 - inst_base.Instruction.code_length) - 1
 
@@ -1695,6 +1703,8 @@ class Tape:
             self.can_eliminate = True
             self.duplicates = util.set_by_id([self])
             self.dup_count = None
+            # compile-time value if loaded from an immediate
+            self.constant = None
             if Program.prog.DEBUG:
                 self.caller = [frame[1:] for frame in inspect.stack()[1:]]
             else:
@@ -1778,6 +1788,8 @@ class Tape:
             self.duplicates |= other.duplicates
             for dup in self.duplicates:
                 dup.duplicates = self.duplicates
+                # linked registers can be written more than once
+                dup.constant = None
 
         def update(self, other):
             """
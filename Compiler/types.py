@@ -897,7 +897,7 @@ class _arithmetic_register(_register):
 class _clear(_arithmetic_register):
     """ Clear domain-dependent type. """
     __slots__ = []
-    mov = staticmethod(movc)
+    mov = staticmethod(set_instruction_type(movc))
 
     @set_instruction_type
     @vectorize
@@ -1117,6 +1117,7 @@ class cint(_clear, _int):
 
     @vectorize
     def load_int(self, val):
+        self.constant = val
         if self.in_immediate_range(val):
             ldi(self, val)
         else:
@@ -1617,6 +1618,7 @@ class regint(_register, _int):
         super(regint, self).__init__(self.reg_type, val=val, size=size)
 
     def load_int(self, val):
+        self.constant = val
         if cint.in_immediate_range(val, regint=True):
             ldint(self, val)
         else:
@@ -6125,14 +6127,42 @@ class Array(_vectorizable):
         :param index: regint/cint/int
         :param value: updated value
         """
-        if self.sink is None:
-            self.sink = self.value_type.Array(
-                1, address=self.value_type.malloc(1, creator_tape=program.tapes[0]))
+        self._make_sink()
         addresses = (condition.if_else(x, y) for x, y in
                      zip(util.tuplify(self.get_address(condition * index)),
                          util.tuplify(self.sink.get_address(0))))
         self._store(value, util.untuplify(tuple(addresses)))
 
+    def maybe_get_vector(self, condition, indices):
+        """ Vector from arbitrary indices, zero where condition is
+        false. Vectorized version of :py:func:`maybe_get`.
+
+        :param condition: 0/1 regint vector
+        :param indices: regint vector
+        """
+        return self.get(condition * indices).zero_if_not(condition)
+
+    def maybe_set_vector(self, condition, indices, vector):
+        """ Change entries at arbitrary indices where condition is
+        true. Vectorized version of :py:func:`maybe_set`.
+
+        :param condition: 0/1 regint vector
+        :param indices: regint vector
+        :param vector: updated values
+        """
+        assert self.value_type.n_elements() == 1
+        self._make_sink()
+        size = len(indices)
+        addresses = condition.if_else(
+            regint.inc(size, self.address, 0) + indices,
+            regint.inc(size, self.sink.address, 0))
+        vector.store_in_mem(addresses)
+
+    def _make_sink(self):
+        if self.sink is None:
+            self.sink = self.value_type.Array(
+                1, address=self.value_type.malloc(1, creator_tape=program.tapes[0]))
+
     # the following two are useful for compile-time lengths
     # and thus differ from the usual Python syntax
     def get_range(self, start, size):
@@ -1,5 +1,7 @@
+import linecache
 import math
 import operator
+import sys
 from functools import reduce
 
 def format_trace(trace, prefix='  '):
@@ -7,9 +9,28 @@ def format_trace(trace, prefix='  '):
         return '<omitted>'
     else:
         return ''.join('\n%sFile "%s", line %s, in %s\n%s  %s' %
-                       (prefix,i[0],i[1],i[2],prefix,i[3][0].strip()) \
+                       (prefix,i[0],i[1],i[2],prefix,trace_line(i).strip()) \
                            for i in reversed(trace))
 
+def trace_line(frame):
+    if len(frame) == 3:
+        # from call_stack(), look up source only now
+        return linecache.getline(frame[0], frame[1])
+    else:
+        return frame[3][0]
+
+def call_stack(depth=1):
+    """ Call stack from the caller of the caller upwards in the format
+    of :py:func:`format_trace` without source lines, which are much
+    cheaper to get than :py:func:`inspect.stack`. """
+    frame = sys._getframe(depth + 1)
+    res = []
+    while frame:
+        res.append((frame.f_code.co_filename, frame.f_lineno,
+                    frame.f_code.co_name))
+        frame = frame.f_back
+    return res
+
 def tuplify(x):
     if isinstance(x, (list, tuple)):
         return tuple(x)
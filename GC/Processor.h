@@ -115,6 +115,7 @@ public:
     void print_reg_signed(unsigned n_bits, Integer value);
     void print_chr(int n);
     void print_str(int n);
+    void print_chars(const string& str);
     void print_float(const vector<int>& args);
     void print_float_prec(int n);
 
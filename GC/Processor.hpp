@@ -488,6 +488,12 @@ void Processor<T>::print_str(int n)
     out << string((char*)&n,sizeof(n)) << flush;
 }
 
+template <class T>
+void Processor<T>::print_chars(const string& str)
+{
+    out << str << flush;
+}
+
 template <class T>
 void Processor<T>::print_float(const vector<int>& args)
 {
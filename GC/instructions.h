@@ -108,6 +108,7 @@
     X(CONVCBITVEC, PROC.convcbitvec(instruction, Ci, 0)) \
     X(PRINTCHR, PROC.print_chr(IMM)) \
     X(PRINTSTR, PROC.print_str(IMM)) \
+    X(PRINTCHRS, PROC.print_chars(instruction.get_str())) \
     X(PRINTFLOATPREC, PROC.print_float_prec(IMM)) \
     X(LDINT, auto d = &I0; for (int i = 0; i < SIZE; i++) *d++ = int(IMM)) \
     X(ADDINT, I0 = PI1 + PI2) \
@@ -206,6 +206,7 @@ enum
     PRINTREGPLAINS = 0xEA,
     PRINTCHR = 0xB4,
     PRINTSTR = 0xB5,
+    PRINTCHRS = 0xEE,
     PUBINPUT = 0xB6,
     RAWOUTPUT = 0xB7,
     STARTPRIVATEOUTPUT = 0xB8,
@@ -368,6 +369,7 @@ public:
   int get_r(int i) const { return r[i]; }
   size_t get_n() const { return n; }
   const vector<int>& get_start() const { return start; }
+  const string& get_str() const { return str; }
   int get_opcode() const { return opcode; }
   int get_size() const { return size; }
 
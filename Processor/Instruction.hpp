@@ -367,6 +367,9 @@ void BaseInstruction::parse_operands(istream& s, int pos, int file_pos)
         get_ints(r, s, 3);
         get_string(str, s);
         break;
+      case PRINTCHRS:
+        get_string(str, s);
+        break;
       case INITSECURESOCKET:
       case RESPSECURESOCKET:
         throw runtime_error("VM-controlled encryption not supported any more");
@@ -206,6 +206,7 @@
     X(PRINTFLOATPREC, Proc.out << setprecision(n),) \
     X(PRINTSTR, Proc.out << string((char*)&n,4) << flush,) \
     X(PRINTCHR, Proc.out << string((char*)&n,1) << flush,) \
+    X(PRINTCHRS, Proc.out << str << flush,) \
     X(SHUFFLE, shuffle(Proc),) \
     X(BITDECINT, bitdecint(Proc),) \
     X(RAND, auto dest = &Ci[r[0]]; auto source = &Ci[r[1]], \
@@ -1,11 +1,10 @@
 #!/usr/bin/env python3
 
 import os, sys
-from copy import copy
 # add MP-SPDZ dir to path so we can import from Compiler. It is assumed this file lives in MP-SPDZ/Programs/Source. 
 sys.path.insert(0, os.path.dirname(sys.argv[0]) + '/../..') 
-from Compiler.library import print_ln, vectorize
-from Compiler.types import cgf2n, sgf2n, Array, Matrix, VectorArray
+from Compiler.library import print_ln, vectorize, break_point, if_e, else_
+from Compiler.types import cgf2n, sgf2n, regint, Array
 from Compiler.compilerLib import Compiler
 
 from embeddings import *
@@ -13,6 +12,29 @@ from embeddings import *
 # CONSTANTS
 BYTES_PER_WORD = 4
 WORDS_PER_BLOCK = 4 # Nb = 4 words = 16 bytes = 128 bits
+NUM_ROUNDS_FROM_KEY_LENGTH = {16: 10, 24: 12, 32: 14} # Nr for keys of 16, 24, or 32 bytes
+EMBEDDED_TWO = field_embedding_int(0x02) # embedding of x, the doubling factor in MixColumns
+# ShiftRows as a permutation of the column-major state: byte j of column i comes from column i + j
+SHIFT_ROWS_PERM = [j + BYTES_PER_WORD * ((i + j) % WORDS_PER_BLOCK) for i in range(WORDS_PER_BLOCK) for j in range(BYTES_PER_WORD)]
+# round constants are public, so embed them at compile time.
+# 0th byte should never be used, it's just that rcon is 1-indexed in FIPS 197
+RCON = [field_embedding_int(x) for x in [0x00, 0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1b, 0x36]]
+
+
+def apply_concatenated(function, values: list[cgf2n | sgf2n]) -> list[cgf2n | sgf2n]:
+    '''
+    Apply an elementwise function to all values with a single vectorized call, and split the
+    result into vectors of the original sizes. Values of mixed types are processed one by one.
+    '''
+    if any(type(x) != type(values[0]) for x in values):
+        return [function(x) for x in values]
+    out = function(type(values[0]).concat(values))
+    res = []
+    base = 0
+    for x in values:
+        res.append(out.get_vector(base, x.size))
+        base += x.size
+    return res
 
 
 class SBox():
@@ -20,7 +42,11 @@ class SBox():
     Implementation of the S-Box, and its inverse, as in FIPS 197. 
     '''
 
-    def __init__(self):
+    def __init__(self, public_table: bool = False):
+        '''
+        :param public_table: bool. Whether to store a table of all embedded S-Box outputs in memory,
+            which is then used to look up cgf2n inputs instead of computing the inversion.
+        '''
         self.EI = EmbeddedInverter()
         self.matrix = [
             [1,0,0,0,1,1,1,1],
@@ -32,37 +58,73 @@ class SBox():
             [0,0,1,1,1,1,1,0],
             [0,0,0,1,1,1,1,1]
         ]
-        self.matrix_inv = [
-            [0,0,1,0,0,1,0,1],
-            [1,0,0,1,0,0,1,0],
-            [0,1,0,0,1,0,0,1],
-            [1,0,1,0,0,1,0,0],
-            [0,1,0,1,0,0,1,0],
-            [0,0,1,0,1,0,0,1],
-            [1,0,0,1,0,1,0,0],
-            [0,1,0,0,1,0,1,0]
-        ]
         self.affine_constant = [1,1,0,0,0,1,1,0]
 
+        # The linear part of the affine transform is GF(2)-linear, so it can be written as
+        # \sum_{i=0}^7 c_i z^{2^i} over GF(2^8). These are the coefficients of the well-known
+        # polynomial form of the S-Box, embedded so that they can be applied to the inverse directly.
+        self.linearized_coefficients = [field_embedding_int(c) for c in [0x05, 0x09, 0xf9, 0x25, 0xf4, 0x01, 0xb5, 0x8f]]
+        self.embedded_affine_constant = field_embedding_int(sum(c << idx for idx, c in enumerate(self.affine_constant)))
+        self.public_table = None
+        if public_table:
+            self.public_table = Array.create_from(cgf2n(self.table_entry(x)) for x in range(256))
+            # the table is written with direct stores but read with indirect loads in apply,
+            # which are not ordered against each other within a basic block
+            break_point()
+
+    def affine_linear_part(self, b_tilde: list[int]) -> int:
+        '''
+        Compile-time affine transform of a bit-decomposed byte, without adding the affine constant.
+
+        :param b_tilde: list[int]. Bits of an unembedded byte, LSB first. Entries are only taken mod 2.
+        :return: int. Unembedded byte.
+        '''
+        return sum((sum(b_tilde[idx] * row[idx] for idx in range(8)) % 2) << i for i, row in enumerate(self.matrix))
+
+    def table_entry(self, x: int) -> int:
+        '''
+        Compile-time S-Box for public bytes.
+
+        :param x: int. Unembedded byte.
+        :return: int. Embedded S-Box output.
+        '''
+        def mul(a, b):
+            # multiplication in GF(2^8) modulo x^8 + x^4 + x^3 + x + 1
+            res = 0
+            for i in range(8):
+                if (b >> i) & 1:
+                    res ^= a
+                a <<= 1
+                if a & 0x100:
+                    a ^= 0x11b
+            return res
+        inv = 1
+        for _ in range(254):
+            inv = mul(inv, x)
+        affine = self.affine_linear_part([(inv >> idx) & 1 for idx in range(8)])
+        return field_embedding_int(affine ^ sum(c << idx for idx, c in enumerate(self.affine_constant)))
+
     def apply(self, byte: cgf2n | sgf2n) -> cgf2n | sgf2n:
         '''
         Applies the S-Box to an embedded byte
 
         :param byte: cgf2n | sgf2n, assumed to be an embedded byte. 
         '''
-        byte_inv_bd = self.EI.invert(byte).bit_decompose(bit_length=40, step=5)
-        b_tilde = apply_inverse_field_embedding_bd(byte_inv_bd) # named b_tilde to match FIPS 197 notation
-        affine_transform = [ sum(b_tilde[idx] * row[idx] for idx in range(8)) + c for row, c in zip(self.matrix, self.affine_constant) ]
-
-        # affine_transform holds our result in unembedded, bit_decomposed form (list of length 8)
-        # so we basically just need the last two lines of apply_field_embedding
-        out_bytes = apply_field_embedding_bd(affine_transform)
-        return type(byte)(sum(out_bytes[idx] * (cgf2n(2) ** (5*idx)) for idx in range(8)))
+        if isinstance(byte, cgf2n) and self.public_table is not None:
+            # public input, just look up the output
+            return self.public_table.get(regint(apply_inverse_field_embedding(byte)))
+        # the linear part of the affine transform is folded into the inversion, see __init__
+        return self.EI.invert_linearized(byte, self.linearized_coefficients) + self.embedded_affine_constant
 
 
 class AESCipher():
     '''
     Implementation of the AES cipher, per FIPS 197.
+
+    The state is a list of 16 embedded bytes, which may be vectors to process several blocks.
+    ShiftRows is a permutation of this list at compile time, and SubBytes applies the S-Box to
+    all bytes as one vector. A bitsliced state would only pay off with a Boolean S-Box circuit,
+    which needs more multiplications and rounds than the inversion in GF(2^40).
     '''
     def __init__(self, key: list[sgf2n], sbox=None):
         '''
@@ -70,18 +132,23 @@ class AESCipher():
         performing key expansion. 
 
         :param key: list[sgf2n]. An unembedded key of length 16, 24, or 32 bytes (128, 192, or 256 bits).
+            The bytes may be vectors to use a different key in every lane of the cipher input.
         :param sbox: SBox, optional. If not provided, a default SBox will be used. 
-
-        TODO: add nparallel as a parameter, and pass it as an arg every time we instantiate a runtime data type (e.g., cgf2n, sgf2n, VectorArray)
         '''
-        assert(len(key) in [16, 24, 32]) # key must be 16, 24, or 32 bytes long
-        num_rounds_from_key_length = {16: 10, 24: 12, 32: 14}
-        self.num_rounds = num_rounds_from_key_length[len(key)] # set num_rounds based on key length
+        assert(len(key) in NUM_ROUNDS_FROM_KEY_LENGTH) # key must be 16, 24, or 32 bytes long
+        self.num_rounds = NUM_ROUNDS_FROM_KEY_LENGTH[len(key)] # set num_rounds based on key length
 
         self.key_length = len(key) // BYTES_PER_WORD # Nk = length of key in words
         self.sbox = sbox if sbox else SBox()
-        key = [apply_field_embedding(x) for x in key] # embed the key, so it is in GF(2^40)
-        self.key_schedule = self.key_expansion(key) # 4*(Nr+1) words = 16*(Nr+1) bytes
+        self.key = apply_concatenated(apply_field_embedding, key) # embed the key, so it is in GF(2^40)
+        # 4*(Nr+1) words = 16*(Nr+1) bytes, computed along with the first cipher call unless needed earlier
+        self._key_schedule = None
+
+    @property
+    def key_schedule(self) -> list[sgf2n]:
+        if self._key_schedule is None:
+            self._key_schedule = self.key_expansion(self.key)
+        return self._key_schedule
 
     def key_expansion(self, key: list[sgf2n]) -> list[sgf2n]:
         '''
@@ -90,61 +157,114 @@ class AESCipher():
         :param key: list[sgf2n]. Assumed to be an embedded key of length self.key_length words
         :return: list[sgf2n]. A key schedule consisting of (self.num_rounds + 1) embedded round keys.
         '''
-        # initialize round constants
-        rcon_raw = [0x00, 0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1b, 0x36] # 0th byte should never be used, it's just that rcon is 1-indexed in FIPS 197
-        # TODO: why does VectorArray keep cropping up? Can't we just do rcon = [cgf2n(x) for x in rcon_raw]?
-        rcon = VectorArray(len(rcon_raw), cgf2n, 1)
-        for idx in range(len(rcon_raw)):
-            rcon[idx] = cgf2n(rcon_raw[idx])
-        
-        # number of round keys is (Nr + 1) blocks
-        key_schedule = [sgf2n(0)] * ((WORDS_PER_BLOCK * BYTES_PER_WORD) * (self.num_rounds + 1))
-        temp = [sgf2n(0)] * BYTES_PER_WORD
-        
         # first Nk words of key schedule are just the key
-        for i in range(self.key_length):
-            for j in range(BYTES_PER_WORD):
-                key_schedule[i * BYTES_PER_WORD + j] = key[i * BYTES_PER_WORD + j]
-        
-        for i in range(self.key_length, WORDS_PER_BLOCK * (self.num_rounds + 1)): 
-            # init temp to (i-1)-th word of key schedule
-            for j in range(BYTES_PER_WORD): # TODO: can we use slicing to clean this up?
-                temp[j] = key_schedule[(i-1) * BYTES_PER_WORD + j]
-
-            # print_ln("i =%s, temp init = %s", i, [apply_inverse_field_embedding(x.reveal()) for x in temp]) # temp is initialized just fine
-
-            # do stuff to temp based on Nk
-            if i % self.key_length == 0:
-                temp = self.sub_word(self.rot_word(temp)) 
-                temp[0] += apply_field_embedding(rcon[i // self.key_length])
-            elif self.key_length > 6 and i % self.key_length == 4:
+        key_schedule = list(key)
+        for i in range(self.key_length, WORDS_PER_BLOCK * (self.num_rounds + 1)):
+            temp = self.key_word_temp(key_schedule, i)
+            if self.key_word_needs_sbox(i):
                 temp = self.sub_word(temp)
-            # next word of key_schedule depends on key_schedule Nk words back, and whatever temp is.
-            for j in range(BYTES_PER_WORD):
-                key_schedule[i * BYTES_PER_WORD + j] = key_schedule[(i - self.key_length) * BYTES_PER_WORD + j] + temp[j]
+            self.add_key_word(key_schedule, i, temp)
         return key_schedule
-    
+
+    def key_word_needs_sbox(self, i: int) -> bool:
+        '''
+        Whether computing word i of the key schedule involves SubWord.
+        '''
+        return i % self.key_length == 0 or (self.key_length > 6 and i % self.key_length == 4)
+
+    def key_word_temp(self, key_schedule: list[sgf2n], i: int) -> list[sgf2n]:
+        '''
+        The word temp of FIPS 197 key expansion for word i before SubWord, i.e. word i-1, rotated if i is a multiple of Nk.
+        '''
+        temp = key_schedule[(i-1) * BYTES_PER_WORD : i * BYTES_PER_WORD]
+        if i % self.key_length == 0:
+            temp = self.rot_word(temp)
+        return temp
+
+    def add_key_word(self, key_schedule: list[sgf2n], i: int, temp: list[sgf2n]):
+        '''
+        Append word i to key_schedule, given temp after SubWord (if any).
+        '''
+        if i % self.key_length == 0:
+            temp = [temp[0] + RCON[i // self.key_length]] + temp[1:]
+        # next word of key_schedule depends on key_schedule Nk words back, and whatever temp is.
+        key_schedule += [key_schedule[(i - self.key_length) * BYTES_PER_WORD + j] + temp[j] for j in range(BYTES_PER_WORD)]
+
+    def sub_bytes_and_expand_key(self, state: list[sgf2n], key_schedule: list[sgf2n], round: int):
+        '''
+        Apply S-Box to state in-place and extend key_schedule in-place up to round key number round.
+        The S-Box for the state and the one in the key expansion (there is at most one SubWord per
+        round key) are applied together. The key expansion is sequential, so it would otherwise
+        take its own communication rounds before the cipher can start.
+        '''
+        done = False
+        for i in range(len(key_schedule) // BYTES_PER_WORD, WORDS_PER_BLOCK * (round + 1)):
+            temp = self.key_word_temp(key_schedule, i)
+            if self.key_word_needs_sbox(i):
+                assert not done
+                out = state + temp
+                self.sub_bytes(out)
+                state[:] = out[:len(state)]
+                temp = out[len(state):]
+                done = True
+            self.add_key_word(key_schedule, i, temp)
+        if not done:
+            self.sub_bytes(state)
+
+    def round_key(self, key_schedule: list[sgf2n], round: int) -> list[sgf2n]:
+        '''
+        Round key number round, i.e., 4 words of key_schedule.
+
+        The key schedule stays in registers rather than an Array: slicing the list only happens
+        at compile time, while memory would cost a store and a load per byte and keep the key
+        words from sharing rounds with the S-boxes of the state.
+        '''
+        block_bytes = WORDS_PER_BLOCK * BYTES_PER_WORD
+        return key_schedule[round * block_bytes : (round + 1) * block_bytes]
+
     def cipher(self, input: list[sgf2n]) -> list[sgf2n | cgf2n]:
         '''
         Apply the AES block cipher to a 128-bit input.
+        Several blocks are best processed by passing vectors in a single call, which also works well
+        with the key expansion on the first call.
 
         :param input: Assumed to be a list[sgf2n] of length 16, where each element holds an unembedded byte in its lower 8 bits.
         :return: Resulting cipher output of length 16, where each element holds an unembedded byte in its lower 8 bits.
         '''
-        state = [apply_field_embedding(x) for x in input] # embed input and copy to state vector
-        round_key = self.key_schedule[0 : (WORDS_PER_BLOCK * BYTES_PER_WORD)] # each round key is 4 words of key schedule
-        self.add_round_key(state, round_key)
+        if self._key_schedule is None:
+            # first call, expand the key on the go
+            key_schedule = list(self.key)
+            sub_bytes = lambda state, round: self.sub_bytes_and_expand_key(state, key_schedule, round)
+        else:
+            key_schedule = self._key_schedule
+            sub_bytes = lambda state, round: self.sub_bytes(state)
+        state = apply_concatenated(apply_field_embedding, input) # embed input and copy to state vector
+        self.add_round_key(state, self.round_key(key_schedule, 0))
+        # num_rounds is fixed by the key length, and this loop runs at compile time,
+        # so the program already is straight-line code specialized to the key length
         for round in range(1, self.num_rounds):
-            self.sub_bytes(state)
-            self.shift_rows(state)
-            self.mix_columns(state)
-            round_key = self.key_schedule[round * WORDS_PER_BLOCK * BYTES_PER_WORD : ((round+1) * WORDS_PER_BLOCK * BYTES_PER_WORD)]
-            self.add_round_key(state, round_key)
-        self.sub_bytes(state)
+            sub_bytes(state, round)
+            self.shift_mix_add_round_key(state, self.round_key(key_schedule, round))
+        sub_bytes(state, self.num_rounds)
         self.shift_rows(state)
-        round_key = self.key_schedule[self.num_rounds * WORDS_PER_BLOCK * BYTES_PER_WORD : ]
-        self.add_round_key(state, round_key)
-        return [apply_inverse_field_embedding(x) for x in state]
+        self.add_round_key(state, self.round_key(key_schedule, self.num_rounds))
+        self._key_schedule = key_schedule
+        return apply_concatenated(apply_inverse_field_embedding, state)
+
+    def cipher_many(self, inputs: list[list[cgf2n | sgf2n]]) -> list[list[sgf2n]]:
+        '''
+        Apply the AES block cipher to several blocks with a single vectorized cipher call,
+        so that all blocks share the same communication rounds.
+
+        :param inputs: list of blocks, each a list of 16 unembedded bytes.
+        :return: list of output blocks, in the same order as inputs.
+        '''
+        if all(isinstance(x, cgf2n) for block in inputs for x in block):
+            lanes = [cgf2n.concat(block[j] for block in inputs) for j in range(len(inputs[0]))]
+        else:
+            lanes = [sgf2n.concat(sgf2n.conv(block[j]) for block in inputs) for j in range(len(inputs[0]))]
+        out = self.cipher(lanes)
+        return [[lane[i] for lane in out] for i in range(len(inputs))]
     
     def cipher_inverse(self, ciphertext):
         '''
@@ -157,8 +277,9 @@ class AESCipher():
 
         :param word: list[sgf2n]. Assumed to hold 1 word = 4 bytes.
         '''
-        return [self.sbox.apply(word[i]) for i in range(BYTES_PER_WORD)]
-        pass
+        word = list(word)
+        self.sub_bytes(word)
+        return word
 
     def rot_word(self, word: list[sgf2n]) -> list[sgf2n]:
         '''
@@ -168,25 +289,14 @@ class AESCipher():
         '''
         return [word[1], word[2], word[3], word[0]]
     
-    def rot_word_left(self, word: list[sgf2n], offset: int) -> list[sgf2n]:
-        '''
-        Rotates word offset bytes to the left. 
-        For example: [a_0, a_1, a_2, a_3] -> [a_1, a_2, a_3, a_0] for offset 1. 
-
-        :param word: list[sgf2n]. Assumed to hold 1 word = 4 bytes
-        :param offset: int. We assume 0 <= offset < 4.
-        '''
-        # return [word[offset % 4], word[(offset + 1) % 4], word[(offset + 2) % 4], word[(offset + 3) % 4]]
-        return word[offset:] + word[:offset]
-
     def sub_bytes(self, state: list[sgf2n]):
         '''
         Apply S-Box to every element (an embedded sgf2n byte) of state in-place
 
         :param state: list[sgf2n]. We assume elements are embedded. Modified in-place. 
         '''
-        for i in range(len(state)):
-            state[i] = self.sbox.apply(state[i])
+        # one S-Box application on all bytes at once
+        state[:] = apply_concatenated(self.sbox.apply, state)
 
     def shift_rows(self, state: list[sgf2n]):
         '''
@@ -196,48 +306,29 @@ class AESCipher():
 
         :param state: list[sgf2n]. We assume elements are embedded, and 4x4 state matrix is stored in column-major order, as specified by FIPS 197. Modified in-place.
         '''
-        for i in range(WORDS_PER_BLOCK): # WORDS_PER_BLOCK = 4 = length of each row, i.e. number of columns.
-            state[i::WORDS_PER_BLOCK] = self.rot_word_left(state[i::WORDS_PER_BLOCK],i)
+        state[:] = [state[i] for i in SHIFT_ROWS_PERM]
 
-    def mix_columns(self, state: list[sgf2n]):
+    def shift_mix_add_round_key(self, state: list[sgf2n], round_key: list[sgf2n]):
         '''
-        Multiply state (viewed as a matrix of embedded values) on the left with 
-        an embedded version of the following fixed MDS matrix:
-        [
-            [0x02, 0x03, 0x01, 0x01],
-            [0x01, 0x02, 0x03, 0x01],
-            [0x01, 0x01, 0x02, 0x03],
-            [0x03, 0x01, 0x01, 0x02]
-        ]
-
-        :param state: list[sgf2n]. Elements assumed to be embedded. Modified in-place. 
+        ShiftRows, MixColumns, and add_round_key in one pass. Modifies state in-place.
 
-        NOTE: In this implementation, we avoid matrix multiplication altogether by exploiting the 
-        specific values of the fixed MDS matrix and properties of binary fields. 
+        Row j of a mixed column is 2*a_j + 3*a_{j+1} + a_{j+2} + a_{j+3} = 2*(a_j + a_{j+1}) + a_j + t
+        with t the sum of the column, which saves additions compared to the matrix product.
+        These operations stay per byte: concatenating the bytes into vectors and splitting the
+        result again costs a move per byte and vector for gf2n, which is more than it saves.
         '''
-
-        def mix_column(column: list[sgf2n]) -> list[sgf2n]:
-            '''
-            Helper function for computing a single column of mix_columns matrix multiplication.
-            '''
-            temp = copy(column)
-            doubles = [apply_field_embedding(cgf2n(2)) * t for t in temp]
-            column[0] = doubles[0] + (temp[1] + doubles[1]) + temp[2] + temp[3]
-            column[1] = temp[0] + doubles[1] + (temp[2] + doubles[2]) + temp[3]
-            column[2] = temp[0] + temp[1] + doubles[2] + (temp[3] + doubles[3])
-            column[3] = (temp[0] + doubles[0]) + temp[1] + temp[2] + doubles[3]
-        
+        shifted = [state[i] for i in SHIFT_ROWS_PERM]
         for i in range(WORDS_PER_BLOCK):
-            column = []
-            for j in range(BYTES_PER_WORD):
-                column.append(state[i*BYTES_PER_WORD+j])
-            mix_column(column)
+            column = shifted[i * BYTES_PER_WORD : (i + 1) * BYTES_PER_WORD]
+            t = column[0] + column[1] + column[2] + column[3]
             for j in range(BYTES_PER_WORD):
-                state[i*BYTES_PER_WORD+j] = column[j]
-    
+                a, b = column[j], column[(j + 1) % BYTES_PER_WORD]
+                state[i * BYTES_PER_WORD + j] = (a + b) * EMBEDDED_TWO + a + t + round_key[i * BYTES_PER_WORD + j]
+
     def add_round_key(self, state: list[sgf2n], round_key: list[sgf2n]):
         '''
         XOR the state with round_key. Modifies state in-place. 
+        This stays per byte for the same reason as in shift_mix_add_round_key.
         '''
         for i in range(len(state)):
             state[i] = state[i] + round_key[i]
@@ -253,14 +344,14 @@ if __name__ == "__main__":
     def test_inverse():
         EI = EmbeddedInverter()
         b = cgf2n(0x8000) # embedding of 0xf
-        b_inv = EI.invert(b)
+        b_inv = EI.invert_linearized(b, [1] + [0] * 7)
         b_inv_alt = cgf2n(1).field_div(b)
         a_inv = apply_inverse_field_embedding(b_inv)
         print_ln("b=%s, b_inv=%s, b_inv_alt=%s, a_inv=%s", b, b_inv, b_inv_alt, a_inv) # b_inv = 0x802008401 = b_inv_alt. a_inv = 0xc7
 
         a = cgf2n(0x8d)
         b = apply_field_embedding(a)
-        b_inv = EI.invert(b)
+        b_inv = EI.invert_linearized(b, [1] + [0] * 7)
         b_inv_alt = cgf2n(1).field_div(b)
         a_inv = apply_inverse_field_embedding(b_inv)
         print_ln("b=%s, b_inv=%s, b_inv_alt=%s, a_inv=%s", b, b_inv, b_inv_alt, a_inv) # a_inv = 0x2
@@ -277,17 +368,6 @@ if __name__ == "__main__":
 
     compiler.compile_func()
 
-    # @compiler.register_function("test_mix_columns")
-    # def test_mix_columns():
-    #     # TODO: consider making mix_columns a static / class method. Don't want/need to compile all of AES for this test. 
-    #     key_raw = "2b7e151628aed2a6abf7158809cf4f3c"
-    #     key = [apply_field_embedding(sgf2n(x)) for x in str_to_hex(key_raw)]
-    #     aes = AESCipher(key)
-
-    #     aes.mix_columns(state)
-
-    # compiler.compile_func()
-
     def str_to_hex(x):
         ''' Convert a string into a list of hex values. Obviously the string should represent valid hex to begin with. '''
         return [int(x[i : i + 2], 16) for i in range(0, len(x), 2)]
@@ -330,19 +410,39 @@ if __name__ == "__main__":
         error_pattern = [x + y for x,y in zip(expected_ct, ct)]
         print_ln("EX2: ciphertext = %s\nexpected ciphertext = %s\nerror_pattern = %s", ct, expected_ct, error_pattern)
 
-        # TODO: why doesn't this work? Get list index out of range in mix_columns: column.append(state[i*4+j])
-        # would be nice if we could get this to work - should give shorter compile times. 
-
-        # key_raw = "2b7e151628aed2a6abf7158809cf4f3c"
-        # key = [apply_field_embedding(sgf2n(x)) for x in str_to_hex(key_raw)]
-        # aes = AESCipher(key)
-        # messages_hex: list[list[int]] = [str_to_hex(x) for x in ["3243f6a8885a308d313198a2e0370734", "6bc1bee22e409f96e93d7e117393172a"]]
-        # expected_ciphertexts_raw: list[list[int]] = [str_to_hex(x) for x in ["3925841d02dc09fbdc118597196a0b32", "3ad77bb40d7a3660a89ecaf32466ef97"]]
-        # msgs = [apply_field_embedding(sgf2n(list(x))) for x in zip(messages_hex)]
-        # expected_cts = [cgf2n(list(x)) for x in zip(expected_ciphertexts_raw)]
-        # cts = [apply_inverse_field_embedding(x.reveal()) for x in aes.cipher(msgs)]
-        # error_patterns = [x + y for x,y in zip(expected_cts, cts)]
-        # print_ln("ciphertexts = %s\nexpected ciphertexts = %s\nerror_patterns = %s", cts, expected_cts, error_patterns)
+    compiler.compile_func()
+
+    @compiler.register_function("test_cipher_many")
+    def test_cipher_many():
+        # FIPS 197 Appendix C.1 example, and more blocks under the same key computed with
+        # openssl enc -aes-128-ecb -K 000102030405060708090a0b0c0d0e0f -nopad
+        key_raw = "000102030405060708090a0b0c0d0e0f"
+        msgs_raw = ["00112233445566778899aabbccddeeff", "3243f6a8885a308d313198a2e0370734", "6bc1bee22e409f96e93d7e117393172a"]
+        expected_cts_raw = ["69c4e0d86a7b0430d8cdb78070b4c55a", "89ed5e6a05ca76338135085fe21c40bd", "47c58d5e21caaf840d015b7d9b910981"]
+        key = [sgf2n(x) for x in str_to_hex(key_raw)]
+        aes = AESCipher(key)
+
+        # test 1: secret blocks, with the key expansion on the go
+        msgs = [[sgf2n(x) for x in str_to_hex(msg_raw)] for msg_raw in msgs_raw[:2]]
+        cts = [[x.reveal() for x in ct] for ct in aes.cipher_many(msgs)]
+        expected_cts = [str_to_hex(x) for x in expected_cts_raw[:2]]
+        @if_e(sum(x != y for ct, expected_ct in zip(cts, expected_cts) for x, y in zip(ct, expected_ct)))
+        def _():
+            print_ln("❌ TEST 1 FAILED\nciphertexts=%s\nexpected ciphertexts=%s", cts, expected_cts)
+        @else_
+        def _():
+            print_ln("✅ TEST 1 PASSED")
+
+        # test 2: public blocks, with the stored key schedule
+        msgs = [[cgf2n(x) for x in str_to_hex(msg_raw)] for msg_raw in msgs_raw[1:]]
+        cts = [[x.reveal() for x in ct] for ct in aes.cipher_many(msgs)]
+        expected_cts = [str_to_hex(x) for x in expected_cts_raw[1:]]
+        @if_e(sum(x != y for ct, expected_ct in zip(cts, expected_cts) for x, y in zip(ct, expected_ct)))
+        def _():
+            print_ln("❌ TEST 2 FAILED\nciphertexts=%s\nexpected ciphertexts=%s", cts, expected_cts)
+        @else_
+        def _():
+            print_ln("✅ TEST 2 PASSED")
 
     compiler.compile_func()
 
@@ -1,71 +1,130 @@
-from aes import AESCipher, WORDS_PER_BLOCK, BYTES_PER_WORD
-from Compiler.library import print_ln
-from Compiler.types import cgf2n, sgf2n, regint
+from aes import AESCipher, WORDS_PER_BLOCK, BYTES_PER_WORD, NUM_ROUNDS_FROM_KEY_LENGTH
+from Compiler.library import print_ln, multithread, if_e, else_
+from Compiler.types import cgf2n, sgf2n, regint, Array
+from Compiler import util
 from Compiler.compilerLib import Compiler
 
 MAX_BLOCKS = 2 ** 32  # maximum number of plaintext blocks we can handle in AES-CTR mode
+BLOCK_BYTES = WORDS_PER_BLOCK * BYTES_PER_WORD
 
 
-def aes_ctr_encrypt(key: list[sgf2n], plaintext: list[cgf2n | sgf2n], nonce: list[cgf2n | sgf2n] = None) -> tuple[list[cgf2n|sgf2n], list[cgf2n|sgf2n]]:
+def _counter_blocks(nonce: list[cgf2n | sgf2n], num_blocks: int, first: int | regint = 0) -> list[cgf2n | sgf2n]:
+    '''
+    Lay out the counter blocks nonce || i for first <= i < first + num_blocks
+    as one vector of size num_blocks per byte position.
+    '''
+    if util.is_zero(first):
+        # byte j of the big-endian counter is (i // 256**(3-j)) % 256
+        counters = [regint.inc(num_blocks, 0, 1, 256 ** (3 - j), 256) for j in range(4)]
+    else:
+        counter = regint.inc(num_blocks, first)
+        counters = [(counter >> (8 * (3 - j))) % 256 for j in range(4)]
+    counters = [cgf2n(x, size=num_blocks) for x in counters]
+    return [_broadcast(x, num_blocks) for x in nonce] + counters
+
+def _broadcast(x: cgf2n | sgf2n, size: int) -> cgf2n | sgf2n:
+    '''
+    Expand a single value to a vector. Public bytes take a constant number
+    of instructions instead of one move per element.
+    '''
+    if isinstance(x, cgf2n):
+        return cgf2n(regint.inc(size, regint(x), 0), size=size)
+    return x.expand_to_vector(size)
+
+def _ctr_keystream(key: list[sgf2n], nonce: list[cgf2n | sgf2n], num_blocks: int, first: int | regint = 0) -> list[cgf2n | sgf2n]:
+    '''
+    Compute the keystream for all blocks with a single vectorized cipher call.
+
+    The key is expanded in every lane as well. This costs some extra triples,
+    but a scalar key schedule cannot share communication rounds with the
+    vectorized cipher, which would roughly double the round count.
+
+    :return: BLOCK_BYTES vectors of size num_blocks, one per byte position.
+    '''
+    # AES block cipher setup (performs key expansion)
+    aes = AESCipher([x.expand_to_vector(num_blocks) for x in key])
+    return aes.cipher(_counter_blocks(nonce, num_blocks, first))
+
+def _ctr_keystream_multithread(key: list[sgf2n], nonce: list[cgf2n | sgf2n], num_blocks: int, n_threads: int) -> list[sgf2n]:
+    '''
+    Like _ctr_keystream, but split the blocks between n_threads threads.
+    Each thread computes its share of the blocks with a single vectorized
+    cipher call. Threads only share memory, so key, nonce, and keystream
+    are passed through arrays.
+    '''
+    key_arr = Array.create_from(key)
+    if all(isinstance(x, cgf2n) for x in nonce):
+        nonce_arr = Array.create_from(nonce)
+    else:
+        nonce_arr = Array.create_from(sgf2n.conv(x) for x in nonce)
+    # one row of num_blocks entries per byte position
+    keystream = Array(BLOCK_BYTES * num_blocks, sgf2n)
+
+    @multithread(n_threads, num_blocks)
+    def _(base, size):
+        lanes = _ctr_keystream(list(key_arr), list(nonce_arr), size, base)
+        for j, lane in enumerate(lanes):
+            keystream.assign_vector(lane, j * num_blocks + base)
+
+    return [keystream.get_vector(j * num_blocks, num_blocks) for j in range(BLOCK_BYTES)]
+
+def _keystream(key: list[sgf2n], nonce: list[cgf2n | sgf2n], num_blocks: int, n_threads: int | None) -> list[cgf2n | sgf2n]:
+    if n_threads is None:
+        return _ctr_keystream(key, nonce, num_blocks)
+    return _ctr_keystream_multithread(key, nonce, num_blocks, n_threads)
+
+def _xor_keystream(data: list[cgf2n | sgf2n] | sgf2n, keystream: list[cgf2n | sgf2n]) -> list[cgf2n | sgf2n] | sgf2n:
+    '''
+    XOR data with a keystream given as one vector per byte position.
+    Data given as a single vector is used as is and the result is a vector as well.
+    '''
+    # transpose the keystream to block order so that one addition covers all bytes.
+    # This stays in registers, as going through memory would mix indirect stores
+    # with a direct load, which the compiler does not keep in order.
+    # Packing bytes into field elements would not save anything on top of that,
+    # and GF(2^40) only has room for five of them anyway.
+    num_blocks = len(data) // BLOCK_BYTES
+    keystream_blocks = sgf2n.concat(sgf2n.conv(lane[i]) for i in range(num_blocks) for lane in keystream)
+    if isinstance(data, sgf2n):
+        return data + keystream_blocks
+    res = sgf2n.concat(sgf2n.conv(x) for x in data) + keystream_blocks
+    return [res[i] for i in range(len(data))]
+
+
+def aes_ctr_encrypt(key: list[sgf2n], plaintext: list[cgf2n | sgf2n] | sgf2n, nonce: list[cgf2n | sgf2n] = None, n_threads: int = None) -> tuple[list[cgf2n|sgf2n], list[cgf2n|sgf2n] | sgf2n]:
     '''
     Encrypt plaintext using AES-CTR mode.
 
     :param key: unembedded key
-    :param plaintext: plaintext to encrypt. Length of plaintext should be multiple of WORDS_PER_BLOCK * BYTES_PER_WORD, since we don't yet support padding.
-    :return: A tuple with the nonce as the first coordinate, and the ciphertext as the second coordinate. 
+    :param plaintext: plaintext to encrypt, either a list of bytes or an sgf2n vector of bytes. Length of plaintext should be multiple of WORDS_PER_BLOCK * BYTES_PER_WORD, since we don't yet support padding.
+    :param n_threads: number of threads to split the blocks between (default: compute all blocks in the current thread)
+    :return: A tuple with the nonce as the first coordinate, and the ciphertext as the second coordinate. The ciphertext is a vector if the plaintext is.
     '''
     # validate plaintext length and set up nonce + counters based on length of plaintext
-    assert(len(plaintext) % (WORDS_PER_BLOCK * BYTES_PER_WORD) == 0) # Too lazy to deal with padding.
-    num_blocks = int(len(plaintext) / (WORDS_PER_BLOCK * BYTES_PER_WORD))
+    assert(len(plaintext) % BLOCK_BYTES == 0) # Too lazy to deal with padding.
+    num_blocks = len(plaintext) // BLOCK_BYTES
     assert(num_blocks <= MAX_BLOCKS)
     if(nonce is None):
         nonce = [cgf2n(regint.get_random(bit_length=8)) for _ in range(12)]
-    counters = [[cgf2n(x) for x in i.to_bytes(length=4)] for i in range(num_blocks)]
 
-    # AES block cipher setup (performs key expansion)
-    aes = AESCipher(key)
-
-    # encrypt
-    plaintext = [plaintext[i * (WORDS_PER_BLOCK*BYTES_PER_WORD) : (i+1) * (WORDS_PER_BLOCK*BYTES_PER_WORD)] for i in range(num_blocks)]
-    ciphertext = plaintext
-    for i in range(num_blocks):
-        cipher_output = aes.cipher(nonce + counters[i])
-        # print_ln("[Encrypt] cipher_output in block %s = %s", i, [x.reveal() for x in cipher_output])
-        # print_ln("[Encrypt] plaintext in block %s = %s", i, [x.reveal() for x in plaintext[i]])
-        # print_ln("[Encrypt] ciphertext before XOR in block %s = %s", i, [x.reveal() for x in ciphertext[i]])
-        for j in range(WORDS_PER_BLOCK * BYTES_PER_WORD):
-            ciphertext[i][j] = plaintext[i][j] + cipher_output[j]
-        # print_ln("[Encrypt] ciphertext after XOR in block %s = %s", i, [x.reveal() for x in ciphertext[i]])
-    return nonce, [c for block in ciphertext for c in block]
+    # encrypt all blocks at once
+    return nonce, _xor_keystream(plaintext, _keystream(key, nonce, num_blocks, n_threads))
     
-def aes_ctr_decrypt(key: list[sgf2n], ciphertext: list[sgf2n], nonce: list[cgf2n]) -> list[sgf2n]:
+def aes_ctr_decrypt(key: list[sgf2n], ciphertext: list[sgf2n] | sgf2n, nonce: list[cgf2n], n_threads: int = None) -> list[sgf2n] | sgf2n:
     '''
     Decrypt ciphertext with nonce and key using AES-CTR mode. 
+    Like in aes_ctr_encrypt, the ciphertext can also be given as an sgf2n vector,
+    and the blocks can be split between n_threads threads.
     '''
     # validate ciphertext length and nonce length and set up counters based on ciphertext length
-    assert(len(ciphertext) % (WORDS_PER_BLOCK * BYTES_PER_WORD) == 0) # Too lazy to deal with padding.
+    assert(len(ciphertext) % BLOCK_BYTES == 0) # Too lazy to deal with padding.
     assert(len(nonce) == 12) 
-    num_blocks = int(len(ciphertext) / (WORDS_PER_BLOCK * BYTES_PER_WORD))
+    num_blocks = len(ciphertext) // BLOCK_BYTES
     assert(num_blocks <= MAX_BLOCKS)
-    counters = [[cgf2n(x) for x in i.to_bytes(length=4)] for i in range(num_blocks)]
+    assert(len(key) in NUM_ROUNDS_FROM_KEY_LENGTH)  # key must be 16, 24, or 32 bytes long
 
-    # AES block cipher setup (performs key expansion)
-    num_rounds_from_key_length = {16: 10, 24: 12, 32: 14}
-    assert(len(key) in num_rounds_from_key_length)  # key must be 16, 24, or 32 bytes long
-    aes = AESCipher(key)
-
-    # decrypt
-    ciphertext = [ciphertext[i * (WORDS_PER_BLOCK*BYTES_PER_WORD) : (i+1) * (WORDS_PER_BLOCK*BYTES_PER_WORD)] for i in range(num_blocks)]
-    plaintext = ciphertext
-    for i in range(num_blocks):
-        cipher_output = aes.cipher(nonce + counters[i])
-        # print_ln("[Decrypt] cipher_output in block %s = %s", i, [x.reveal() for x in cipher_output])
-        # print_ln("[Decrypt] ciphertext in block %s = %s", i, [x.reveal() for x in ciphertext[i]])
-        # print_ln("[Decrypt] plaintext before XOR in block %s = %s", i, [x.reveal() for x in plaintext[i]])
-        for j in range(WORDS_PER_BLOCK * BYTES_PER_WORD):
-            plaintext[i][j] = ciphertext[i][j] + cipher_output[j]
-        # print_ln("[Decrypt] plaintext after XOR in block %s = %s", i, [x.reveal() for x in plaintext[i]])
-    return [b for block in plaintext for b in block]
+    # decrypt all blocks at once
+    return _xor_keystream(ciphertext, _keystream(key, nonce, num_blocks, n_threads))
 
 
 if __name__ == "__main__":
@@ -83,15 +142,39 @@ if __name__ == "__main__":
         key = [sgf2n(x) for x in str_to_hex(key_raw)]
         msg_raw = "68656C6C6F2074686572652C207468697320697320612074657374206D65737361676520666F7220656E6372797074696F6E20707572706F7365732E2E2E2E2E"
         msg = [sgf2n(x) for x in str_to_hex(msg_raw)]
-        # test_nonce = [cgf2n(x) for x in [0xb2, 0xf, 0x14, 0xbd, 0x91, 0x25, 0xd8, 0x48, 0xa7, 0xa7, 0x30, 0x1a]]
+
+        # test 1: known ciphertext, computed with
+        # openssl enc -aes-128-ctr -K <key> -iv <nonce>00000000 -nopad
+        test_nonce = [cgf2n(x) for x in [0xb2, 0xf, 0x14, 0xbd, 0x91, 0x25, 0xd8, 0x48, 0xa7, 0xa7, 0x30, 0x1a]]
+        expected_ct = str_to_hex("0d213bc386d781248caf0a131a914edafeda827baad45043bab592296454fd93" + "8831817dd9648299f5d22b741d3581109c879d38b8e1b3d2738511be391de598")
+        _, ct = aes_ctr_encrypt(key, msg, test_nonce)
+        ct = [x.reveal() for x in ct]
+        @if_e(sum(x != y for x, y in zip(ct, expected_ct)))
+        def _():
+            print_ln("❌ TEST 1 FAILED\nct=%s\nexpected ct=%s", ct, expected_ct)
+        @else_
+        def _():
+            print_ln("✅ TEST 1 PASSED")
+
+        # test 2: decryption with a random nonce recovers the message
         nonce, ct = aes_ctr_encrypt(key, msg)
         pt = aes_ctr_decrypt(key, ct, nonce)
-        print_ln("msg=%s", [x.reveal() for x in msg])
-        print_ln("final plaintext = %s", [x.reveal() for x in pt])
-        print_ln("error pattern = %s", [x.reveal() + y.reveal() for x,y in zip(msg, pt)])
-        # TODO: can import a python impl of AES encryption and test it against this. Much better method of testing. 
-        # from crypto.cipher import aes... etc. 
-        # py cryptodome? 
-        # during testing, don't harcode message. instead randomly generate messages. 
+        error_pattern = [x.reveal() + y.reveal() for x,y in zip(msg, pt)]
+        @if_e(sum(x != 0 for x in error_pattern))
+        def _():
+            print_ln("❌ TEST 2 FAILED\nmsg=%s\nfinal plaintext=%s", [x.reveal() for x in msg], [x.reveal() for x in pt])
+        @else_
+        def _():
+            print_ln("✅ TEST 2 PASSED")
+
+        # test 3: the known ciphertext of test 1 with the blocks split between two threads
+        _, ct = aes_ctr_encrypt(key, msg, test_nonce, n_threads=2)
+        ct = [x.reveal() for x in ct]
+        @if_e(sum(x != y for x, y in zip(ct, expected_ct)))
+        def _():
+            print_ln("❌ TEST 3 FAILED\nct=%s\nexpected ct=%s", ct, expected_ct)
+        @else_
+        def _():
+            print_ln("✅ TEST 3 PASSED")
 
     compiler.compile_func()
\ No newline at end of file
@@ -10,83 +10,94 @@ from copy import copy
 from utils import str_to_hex
 
 BLOCK_SIZE = WORDS_PER_BLOCK * BYTES_PER_WORD
+# degree 128 irreducible poly defined by 0^{120} || 10000111 as in CMAC standard
+CMAC_R = [0] * (BLOCK_SIZE - 1) + [0x87]
 
 
 
-def aes_cmac(key: list[sgf2n], m: list[sgf2n | cgf2n], tlen: int) -> list[sgf2n | cgf2n]: 
+def _double(dec: list[list[sgf2n]]) -> list[list[sgf2n]]:
     '''
-    CMAC(K,M,Tlen) as as described in NIST SP 800-38B (with AES cipher).
+    (x<<1) if msb(x) == 0, else (x<<1) XOR R, for a block x given as bytes decomposed LSB first.
+    R is public, so multiplying it with the msb is local.
+    '''
+    msb = dec[0][-1]
+    shifted_lsb = [dec[i+1][-1] for i in range(BLOCK_SIZE - 1)] + [0] # lsb of shifted byte i is msb of byte i+1
+    shifted = [[lsb] + byte[:-1] for lsb, byte in zip(shifted_lsb, dec)] # rotate each decomposed byte one bit to the RIGHT (since LSB first in each word).
+    return [[bit + msb * ((r >> j) & 1) for j, bit in enumerate(byte)] for byte, r in zip(shifted, CMAC_R)]
+
+class AESCMAC():
+    '''
+    CMAC(K,M,Tlen) as as described in NIST SP 800-38B (with AES cipher), for a fixed key K.
+    The key expansion and the subkeys are computed once, and then shared by all messages
+    authenticated with mac.
     For ease of implementation, we enforce that the message and tag are byte-aligned. 
     Additionally, we enforce that tlen <= BLOCK_SIZE.
-
-    :param key: MAC key represented as unembedded list[sgf2n]
-    :param m: the message to be authenticated
-    :param tlen: compile-time int representing the length of the outputted tag in bytes.
     '''
-    assert(tlen <= BLOCK_SIZE)
-    
-    # define subkey generation function using aes as the cipher. 
-    aes = AESCipher(key)
-    def subkey() -> tuple[list[sgf2n], list[sgf2n]]:
+    def __init__(self, key: list[sgf2n]):
         '''
-        SUBK(k) function as described in NIST SP 800-38B for use in CMAC.
+        :param key: MAC key represented as unembedded list[sgf2n]
+        '''
+        self.aes = AESCipher(key)
+        self.k_1, self.k_2 = self.subkey()
 
-        NOTE: As implemented here subkey does not take in a key parameter, 
-        since we construct the aes instance outside of the function scope. 
-        This is only to save on multiple constructions of aes. Ideally there's 
-        a better way without having to construct aes more than once...
+    def subkey(self) -> tuple[list[sgf2n], list[sgf2n]]:
+        '''
+        SUBK(k) function as described in NIST SP 800-38B for use in CMAC, with k the key of self.aes.
         '''
-        # degree 128 irreducible poly defined by 0^{120} || 10000111 as in CMAC standard
-        R = [sgf2n(0) for _ in range(15)] + [sgf2n(0x87)] 
-        zero_block = [sgf2n(0) for _ in range(BLOCK_SIZE)] # no need to embed 0
-        L = aes.cipher(zero_block)
-
-        # compute k_1 as (L<<1) if msb(L) == 0, else (L<<1) XOR R
-        L = [byte.bit_decompose(8) for byte in L]
-        L_msb = L[0][-1]
-        L_shifted_lsb = [L[i+1][-1] for i in range(BLOCK_SIZE - 1)] + [sgf2n(0)] # lsb of L_shifted[i] is msb of L[i+1]
-        L_shifted = [[lsb] + byte[:-1] for lsb, byte in zip(L_shifted_lsb,L)] # rotate each decomposed byte one bit to the RIGHT (since LSB first in each word).
-        L_shifted = [sgf2n.bit_compose(byte) for byte in L_shifted] # L_shifted := L << 1
-        k_1 = [byte + (L_msb * r) for byte, r in zip(L_shifted, R)]
-
-        # compute k_2 as (k_1<<1) if msb(k_1) == 0, else (k_1<<1) XOR R
-        k_1_dec = [byte.bit_decompose(bit_length=8) for byte in k_1]
-        k_1_msb = k_1_dec[0][-1]
-        k_1_shifted_lsb = [k_1_dec[i+1][-1] for i in range(BLOCK_SIZE - 1)] + [sgf2n(0)]
-        k_1_shifted_dec = [[k_1_shifted_lsb[i]] + byte[:-1] for i, byte in enumerate(k_1_dec)]
-        k_1_shifted = [sgf2n.bit_compose(byte) for byte in k_1_shifted_dec]
-        k_2 = [byte + (k_1_msb * r) for byte, r in zip(k_1_shifted, R)]
+        zero_block = [cgf2n(0) for _ in range(BLOCK_SIZE)] # public, so embedding it is local
+        L = self.aes.cipher(zero_block)
+
+        # compute k_1 as (L<<1) if msb(L) == 0, else (L<<1) XOR R, and k_2 the same way from k_1.
+        # Doubling is linear on the bits, so only L has to be bit decomposed.
+        L_dec = [byte.bit_decompose(8) for byte in L]
+        k_1_dec = _double(L_dec)
+        k_2_dec = _double(k_1_dec)
+        k_1 = [sgf2n.bit_compose(byte) for byte in k_1_dec]
+        k_2 = [sgf2n.bit_compose(byte) for byte in k_2_dec]
 
         return k_1, k_2
 
-    # generate subkeys
-    k_1, k_2 = subkey() 
-
-    # set last block of m; pad if necessary
-    n = ceil(len(m) / (BLOCK_SIZE)) if len(m) != 0 else 1 # number of blocks in m
-    m = copy(m) # avoid mutating argument
-    last_block = m[(n-1)*BLOCK_SIZE:]
-    if len(last_block) == BLOCK_SIZE:
-        last_block = [k_1[i] + last_block[i] for i in range(BLOCK_SIZE)]
-    else: # need to pad!
-        padding = [sgf2n(0)] * (BLOCK_SIZE - len(last_block))
-        first_padding_byte = padding[0].bit_decompose(8)
-        first_padding_byte[-1] = sgf2n(1)
-        padding[0] = sgf2n.bit_compose(first_padding_byte)
-        last_block = last_block + padding
-        last_block = [k_2[i] + last_block[i] for i in range(BLOCK_SIZE)]
-    m[(n-1)*BLOCK_SIZE:] = last_block
-    assert(len(m) == n * BLOCK_SIZE)
-
-    # cipher block chaining
-    c = [sgf2n(0)] * BLOCK_SIZE
-    for i in range(n):
-        block = m[i*BLOCK_SIZE : (i+1)*BLOCK_SIZE]
-        c = aes.cipher([c[i] + block[i] for i in range(BLOCK_SIZE)])
-
-    # extract tag from tlen most significant bits of c
-    tag = c[:tlen]
-    return tag
+    def mac(self, m: list[sgf2n | cgf2n], tlen: int) -> list[sgf2n | cgf2n]:
+        '''
+        :param m: the message to be authenticated
+        :param tlen: compile-time int representing the length of the outputted tag in bytes.
+        '''
+        assert(tlen <= BLOCK_SIZE)
+
+        # set last block of m; pad if necessary
+        n = ceil(len(m) / (BLOCK_SIZE)) if len(m) != 0 else 1 # number of blocks in m
+        m = copy(m) # avoid mutating argument
+        last_block = m[(n-1)*BLOCK_SIZE:]
+        if len(last_block) == BLOCK_SIZE:
+            last_block = [self.k_1[i] + last_block[i] for i in range(BLOCK_SIZE)]
+        else: # need to pad!
+            # 10*0 padding, i.e., the first padding byte has only its msb set
+            padding = [cgf2n(0x80)] + [cgf2n(0)] * (BLOCK_SIZE - len(last_block) - 1)
+            last_block = last_block + padding
+            last_block = [self.k_2[i] + last_block[i] for i in range(BLOCK_SIZE)]
+        m[(n-1)*BLOCK_SIZE:] = last_block
+        assert(len(m) == n * BLOCK_SIZE)
+
+        # cipher block chaining
+        c = [0] * BLOCK_SIZE
+        for i in range(n):
+            block = m[i*BLOCK_SIZE : (i+1)*BLOCK_SIZE]
+            c = self.aes.cipher([c[i] + block[i] for i in range(BLOCK_SIZE)])
+
+        # extract tag from tlen most significant bits of c
+        tag = c[:tlen]
+        return tag
+
+def aes_cmac(key: list[sgf2n], m: list[sgf2n | cgf2n], tlen: int) -> list[sgf2n | cgf2n]: 
+    '''
+    CMAC(K,M,Tlen) as as described in NIST SP 800-38B (with AES cipher).
+    Use AESCMAC directly to authenticate several messages with the same key.
+
+    :param key: MAC key represented as unembedded list[sgf2n]
+    :param m: the message to be authenticated
+    :param tlen: compile-time int representing the length of the outputted tag in bytes.
+    '''
+    return AESCMAC(key).mac(m, tlen)
 
 
 
@@ -127,4 +138,42 @@ if __name__ == "__main__":
         def _():
             print_ln("✅ TEST 2 PASSED")
 
+        # tests 3-5 share the subkeys of one AESCMAC, see RFC 4493 Section 4
+        cmac = AESCMAC(key)
+
+        # test 3: subkeys
+        k_1, k_2 = [x.reveal() for x in cmac.k_1], [x.reveal() for x in cmac.k_2]
+        expected_k_1 = str_to_hex("FBEED618357133667C85E08F7236A8DE")
+        expected_k_2 = str_to_hex("F7DDAC306AE266CCF90BC11EE46D513B")
+        @if_e(sum(x != y for x, y in zip(k_1 + k_2, expected_k_1 + expected_k_2)))
+        def _():
+            print_ln("❌ TEST 3 FAILED\nk_1=%s\nk_2=%s", k_1, k_2)
+        @else_
+        def _():
+            print_ln("✅ TEST 3 PASSED")
+
+        # test 4: 40-byte message
+        msg_raw = "6BC1BEE22E409F96E93D7E117393172A" + "AE2D8A571E03AC9C9EB76FAC45AF8E51" + "30C81C46A35CE411"
+        msg = [sgf2n(byte) for byte in str_to_hex(msg_raw)]
+        tag = [t.reveal() for t in cmac.mac(msg, BLOCK_SIZE)]
+        expected_tag = str_to_hex("DFA66747DE9AE63030CA32611497C827")
+        @if_e(sum(x != y for x, y in zip(tag, expected_tag)))
+        def _():
+            print_ln("❌ TEST 4 FAILED\ntag=%s\nexpected tag=%s", tag, expected_tag)
+        @else_
+        def _():
+            print_ln("✅ TEST 4 PASSED")
+
+        # test 5: 64-byte message
+        msg_raw += "E5FBC1191A0A52EFF69F2445DF4F9B17" + "AD2B417BE66C3710"
+        msg = [sgf2n(byte) for byte in str_to_hex(msg_raw)]
+        tag = [t.reveal() for t in cmac.mac(msg, BLOCK_SIZE)]
+        expected_tag = str_to_hex("51F0BEBF7E3B9D92FC49741779363CFE")
+        @if_e(sum(x != y for x, y in zip(tag, expected_tag)))
+        def _():
+            print_ln("❌ TEST 5 FAILED\ntag=%s\nexpected tag=%s", tag, expected_tag)
+        @else_
+        def _():
+            print_ln("✅ TEST 5 PASSED")
+
     compiler.compile_func()
@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 
-import os, sys
+import os, sys, operator
 from copy import copy
 # add MP-SPDZ dir to path so we can import from Compiler. It is assumed this file lives in MP-SPDZ/Programs/Source. 
 sys.path.insert(0, os.path.dirname(sys.argv[0]) + '/../..') 
 from Compiler.library import print_ln, vectorize, if_e, else_
-from Compiler.types import cgf2n, sgf2n, Array, Matrix, VectorArray
+from Compiler.types import cgf2n, sgf2n
+from Compiler.util import tree_reduce
 from Compiler.compilerLib import Compiler
 
 def apply_field_embedding_bd(in_bytes: list[cgf2n | sgf2n]) -> list[cgf2n | sgf2n]:
@@ -18,19 +19,23 @@ def apply_field_embedding_bd(in_bytes: list[cgf2n | sgf2n]) -> list[cgf2n | sgf2
     :param in_bytes: list[cgf2n | sgf2n]. Assumed to hold an element of GF(2^8) in bit decomposed form. 
     :returns: list[cgf2n | sgf2n]. Same type as in_bytes. Image of in_bytes in GF(2^40) under embedding f.
     '''
-    out_bytes = [type(in_bytes[0])(0) for _ in range(8)] # will hold coefficients of 1, y^5, y^10,...,y^35 determined by embedding
     # embedding f can be computed as as:
     # f( \sum_{i=0}^7 a_i x^i ) 
     # = \sum_{i=0}^7 a_i (y^5+1)^i 
     # = \sum_{i=0}^7 a_i ( \sum_{k=0}^i \binom{i}{k} y^5k)
-    out_bytes[0] = sum(in_bytes[0:8]) # a_0 + ... + a_7
-    out_bytes[1] = in_bytes[1] + in_bytes[3] + in_bytes[5] + in_bytes[7] # a_1 + a_3 + a_5 + a_7
-    out_bytes[2] = in_bytes[2] + in_bytes[3] + in_bytes[6] + in_bytes[7] # a_2 + a_3 + a_6 + a_7
-    out_bytes[3] = in_bytes[3] + in_bytes[7] # a_3 + a_7
-    out_bytes[4] = in_bytes[4] + in_bytes[5] + in_bytes[6] + in_bytes[7] # a_4 + a_5 + a_6 + a_7
-    out_bytes[5] = in_bytes[5] + in_bytes[7] # a_5 + a_7
-    out_bytes[6] = in_bytes[6] + in_bytes[7] # a_6 + a_7
-    out_bytes[7] = in_bytes[7] # a_7
+    # out_bytes[k] holds the coefficient of y^5k. Sums are shared between the coefficients, 
+    # which keeps the number of additions down and the depth at three.
+    a = in_bytes
+    a23, a37, a57, a67 = a[2] + a[3], a[3] + a[7], a[5] + a[7], a[6] + a[7]
+    out_bytes = [None] * 8
+    out_bytes[7] = a[7] # a_7
+    out_bytes[6] = a67 # a_6 + a_7
+    out_bytes[5] = a57 # a_5 + a_7
+    out_bytes[4] = (a[4] + a[5]) + a67 # a_4 + a_5 + a_6 + a_7
+    out_bytes[3] = a37 # a_3 + a_7
+    out_bytes[2] = a23 + a67 # a_2 + a_3 + a_6 + a_7
+    out_bytes[1] = (a[1] + a[3]) + a57 # a_1 + a_3 + a_5 + a_7
+    out_bytes[0] = ((a[0] + a[1]) + a23) + out_bytes[4] # a_0 + ... + a_7
     return out_bytes
 
 def apply_inverse_field_embedding_bd(in_bytes: list[cgf2n | sgf2n]) -> list[cgf2n | sgf2n]:
@@ -43,17 +48,8 @@ def apply_inverse_field_embedding_bd(in_bytes: list[cgf2n | sgf2n]) -> list[cgf2
     :param in_bytes: list[cgf2n | sgf2n]. Assumed to hold the image of some GF(2^8) element under the embedding f in bit decomposed form. 
     :returns: list[cgf2n | sgf2n]. Same type as in_bytes. Holds f^{-1}(y) 
     '''
-    out_bytes = [type(in_bytes[0])(0) for _ in range(8)] # will hold coefficients of x^0, x^1,...,x^7 determined by inverse embedding
-    # essentially undo the XORs from apply_field_embedding_bd
-    out_bytes[7] = in_bytes[7]
-    out_bytes[6] = in_bytes[6] + out_bytes[7]
-    out_bytes[5] = in_bytes[5] + out_bytes[7]
-    out_bytes[4] = in_bytes[4] + out_bytes[5] + out_bytes[6] + out_bytes[7]
-    out_bytes[3] = in_bytes[3] + out_bytes[7]
-    out_bytes[2] = in_bytes[2] + out_bytes[3] + out_bytes[6] + out_bytes[7]
-    out_bytes[1] = in_bytes[1] +  out_bytes[3] + out_bytes[5] + out_bytes[7]
-    out_bytes[0] = in_bytes[0] + sum(out_bytes[1:8])
-    return out_bytes
+    # the matrix of f restricted to the coefficients of 1, y^5,...,y^35 is its own inverse
+    return apply_field_embedding_bd(in_bytes)
 
 def apply_field_embedding(x: cgf2n | sgf2n) -> cgf2n | sgf2n:
     '''
@@ -69,7 +65,18 @@ def apply_field_embedding(x: cgf2n | sgf2n) -> cgf2n | sgf2n:
     out_bytes = apply_field_embedding_bd(in_bytes)
 
     # now that we have the coefficients in out_bytes, need to multiply them by their respective y^{5k} and sum into a single cgf2n/sgf2n
-    return type(x)(sum(out_bytes[idx] * (cgf2n(2) ** (5*idx)) for idx in range(8)))
+    return type(x)(sum(out_bytes[idx] * (1 << (5 * idx)) for idx in range(8)), size=x.size)
+
+def field_embedding_int(x: int) -> int:
+    '''
+    Compile-time version of apply_field_embedding for public bytes.
+
+    :param x: int. Element of GF(2^8) in its lower 8 bits.
+    :returns: int. Image of x in GF(2^40) under embedding f.
+    '''
+    # apply_field_embedding_bd sums over the integers here, so reduce mod 2
+    out_bits = apply_field_embedding_bd([(x >> i) & 1 for i in range(8)])
+    return sum((b % 2) << (5 * idx) for idx, b in enumerate(out_bits))
 
 def apply_inverse_field_embedding(y: cgf2n | sgf2n) -> cgf2n | sgf2n:
     '''
@@ -86,7 +93,7 @@ def apply_inverse_field_embedding(y: cgf2n | sgf2n) -> cgf2n | sgf2n:
     out_bytes = apply_inverse_field_embedding_bd(in_bytes)
    
     # now that we have the coefficients in out_bytes, need to multiply them by their respective x^k
-    return type(y)(sum(out_bytes[idx] * (cgf2n(2) ** idx) for idx in range(8)))
+    return type(y)(sum(out_bytes[idx] * (1 << idx) for idx in range(8)), size=y.size)
 
 class EmbeddedInverter():
     '''
@@ -106,7 +113,13 @@ class EmbeddedInverter():
 
     To be extra concrete, if we have a GF(2^40) element z = c_0 + c_1y + ... + c_{39}y^{39},
     then to compute z^{2^i}, we can take every non-zero c_j*y^j term in z and raise it to 2^i: c_j * y^{2^i * j},
-    which just amounts to a lookup in the embedded_powers table. 
+    which just amounts to a lookup in the embedded_powers table.
+
+    The squarings are therefore free once z is bit-decomposed, and only the products cost
+    multiplications. A shorter addition chain would save products, but every intermediate power
+    that has to be squared again would need another secret bit decomposition.
+    Boolean S-Box circuits such as Boyar-Peralta's do not help either: their 32 AND gates are
+    32 secret multiplications per byte, on top of decomposing every byte into bits.
     '''
 
     def __init__(self, size=1):
@@ -135,35 +148,47 @@ class EmbeddedInverter():
             [0x1,0x108,0x10040,0x1084200,0x100001000,0x800000401,0x4000800100,0x80010042,0x8401084010,0x2108401000,0x20,0x2100,0x200800,0x21084000,0x2000020000,0x100421,0x10840008,0x1000200840,0x8020004210,0x2108401004,0x400,0x42000,0x4010000,0x421080000,0x21004,0x2008420,0x210800100,0x4200002,0x401000210,0x2108401084,0x8000,0x840000,0x80200000,0x8421000000,0x420080,0x40108400,0x4210002000,0x84000040,0x8020004200,0x2108400084]
         ]
 
-        embedded_powers = VectorArray(8 * 40, cgf2n, size)
-        for i,_list in enumerate(_embedded_powers):
-            for j,x in enumerate(_list):
-                embedded_powers[40 * i + j] = cgf2n(x, size=size)
-        self.embedded_powers = embedded_powers
+        # keep the table as public compile-time values, so that lookups become multiplications
+        # by immediates instead of loads from memory that have to be broadcast to the input size
+        self.embedded_powers = [x for _list in _embedded_powers for x in _list]
         self.size = size
     
-    def repeated_squaring(self, bd_val: list[cgf2n | sgf2n], exponent: int) -> cgf2n | sgf2n:
+    def repeated_squaring(self, bd_val: list[cgf2n | sgf2n], exponent: int, step: int = 1) -> cgf2n | sgf2n:
         '''
         Compute bd_val^{2^exponent} using lookups into self.embedded_powers
 
         :param bd_val: list[cgf2n | sgf2n]. A bit-decomposed GF(2^40) value. 
         :param exponent: int. Constrained to 0 <= exponent <= 7, by self.embedded_powers lookup table. 
+        :param step: int. bd_val holds every step-th bit, as returned by bit_decompose(step=step).
         '''
-        return sum(self.embedded_powers[exponent * 40 + idx] * bd_val[idx] for idx in range(len(bd_val)))
+        return tree_reduce(operator.add, [self.embedded_powers[exponent * 40 + idx * step] * bd_val[idx] for idx in range(len(bd_val))])
 
-    def invert(self, val: cgf2n | sgf2n) -> cgf2n | sgf2n:
+    def invert_linearized(self, val: cgf2n | sgf2n, coefficients: list[int]) -> cgf2n | sgf2n:
         '''
-        Compute val^254 via exponentiation by squaring. 
+        Compute L(val^-1) for the GF(2)-linear map L(z) = sum_{i=0}^7 c_i z^{2^i} given by
+        the embedded coefficients c_i, without bit-decomposing val^-1 again.
+
+        (val^-1)^{2^i} = val^{255 - 2^i} is the product of all val^{2^j} with j != i. For a set H
+        of these powers, let w(H) = sum_{i in H} c_i prod_{j in H, j != i} val^{2^j}.
+        Then w(H_1 + H_2) = prod(H_2) w(H_1) + prod(H_1) w(H_2), and w of a single power is
+        just its public coefficient. Evaluated as a tree, this takes 12 multiplications in
+        three rounds, compared to 6 multiplications for val^-1 plus a second bit decomposition
+        to apply L. The plain inverse is given by the coefficients 1, 0, ..., 0.
 
         :param val: cgf2n/sgf2n, assumed to be a GF(2^8) value embedded in GF(2^40)
+        :param coefficients: list[int]. c_0,...,c_7, embedded in GF(2^40).
         :returns: cgf2n/sgf2n, same type as val
         '''
-
-        bd_val = val.bit_decompose(bit_length=40)
-        powers_of_val = [0] * 129
-        for idx in range(1,8):
-            powers_of_val[2 ** idx] = self.repeated_squaring(bd_val, idx)
-        return (powers_of_val[2] * powers_of_val[4] * powers_of_val[8] * powers_of_val[16] * powers_of_val[32] * powers_of_val[64] * powers_of_val[128])
+        def combine(a, b):
+            (prod_a, w_a), (prod_b, w_b) = a, b
+            return prod_a * prod_b, prod_b * w_a + prod_a * w_b
+
+        bd_val = val.bit_decompose(bit_length=40, step=5)
+        powers_of_val = [val] + [self.repeated_squaring(bd_val, idx, step=5) for idx in range(1, 8)] # val, val^2, ..., val^128
+        leaves = list(zip(powers_of_val, coefficients))
+        # the product of all powers is not needed at the top
+        (prod_a, w_a), (prod_b, w_b) = tree_reduce(combine, leaves[:4]), tree_reduce(combine, leaves[4:])
+        return prod_b * w_a + prod_a * w_b
     
 if __name__ == "__main__":
     usage = "usage: %prog [options] [args]"
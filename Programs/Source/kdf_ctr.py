@@ -11,7 +11,7 @@ from math import ceil
 
 # we assume these modules reside in Programs/Source/ 
 from embeddings import apply_field_embedding, apply_inverse_field_embedding
-from cmac import aes_cmac, BLOCK_SIZE
+from cmac import AESCMAC, BLOCK_SIZE
 from utils import int_to_sgf2n_bytes, str_to_hex
 
 def kdf_ctr(kdk: list[sgf2n], h: int, r: int,  L: int, label: list[sgf2n], context: list[sgf2n]) -> list[sgf2n]:
@@ -32,11 +32,12 @@ def kdf_ctr(kdk: list[sgf2n], h: int, r: int,  L: int, label: list[sgf2n], conte
 
     sep = sgf2n(0x00) # separator between label and context
     L_bytes = int_to_sgf2n_bytes(L, ceil(L.bit_length() / 8))
+    cmac = AESCMAC(kdk) # subkeys are the same for all blocks
     res = []
     for i in range(n):
         ctr = int_to_sgf2n_bytes(i, r)
         cmac_input = ctr + label + [sep] + context + L_bytes
-        res += aes_cmac(kdk, cmac_input, h)
+        res += cmac.mac(cmac_input, h)
     # get L leftmost bytes of result
     return res[:L]
 